@@ -1,34 +1,18 @@
 import argparse
 import json
+import sys
 
-from taxaplease import TaxaPlease
-from taxaplease import __version__ as tpVersion
+from taxaplease_version import __version__ as tpVersion
 
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
 
-def init_argparser():
-    parser = argparse.ArgumentParser(
-        prog="taxaplease",
-        description="A tool for wrangling NCBI taxonomy.",
-        epilog="Subcommands have their own help available with -h",
-    )
-
-    parser.add_argument("-V", "--version", action="version", version=f"%(prog)s {tpVersion}")
-
-    ## subparsers are mutually exclusive by default
-    subparsers = parser.add_subparsers(required=True, dest="subcommand")
-    parser_taxid = subparsers.add_parser("taxid", help="Return a taxid")
-    parser_record = subparsers.add_parser("record", help="Return a full taxon record")
-    parser_check = subparsers.add_parser("check", help="Check metadata")
-    parser_taxonomy = subparsers.add_parser(
-        "taxonomy", help="Get valid taxonomy URLs and set taxaPlease to use them"
-    )
 
+def _add_taxid_arguments(parser_taxid):
     group_taxid = parser_taxid.add_mutually_exclusive_group()
-    group_record = parser_record.add_mutually_exclusive_group()
-    group_check = parser_check.add_mutually_exclusive_group()
-    group_taxonomy = parser_taxonomy.add_mutually_exclusive_group()
 
-    ## taxids
     group_taxid.add_argument("--parent", help="Get the parent taxid", metavar="<taxid>")
     group_taxid.add_argument(
         "--genus", help="Get the taxid corresponding to the genus", metavar="<taxid>"
@@ -51,7 +35,10 @@ def init_argparser():
         nargs=2,
     )
 
-    ## records
+
+def _add_record_arguments(parser_record):
+    group_record = parser_record.add_mutually_exclusive_group()
+
     group_record.add_argument("--parent", help="Get the parent record", metavar="<taxid>")
     group_record.add_argument(
         "--record", help="Get the record for the input taxid", metavar="<taxid>"
@@ -63,7 +50,10 @@ def init_argparser():
         nargs=2,
     )
 
-    ## other
+
+def _add_check_arguments(parser_check):
+    group_check = parser_check.add_mutually_exclusive_group()
+
     group_check.add_argument(
         "--levels-between",
         help="Check the number of levels between two taxids (JSON output)",
@@ -98,7 +88,10 @@ def init_argparser():
         metavar="<taxid>",
     )
 
-    ## taxonomy
+
+def _add_taxonomy_arguments(parser_taxonomy):
+    group_taxonomy = parser_taxonomy.add_mutually_exclusive_group()
+
     group_taxonomy.add_argument(
         "--set", help="Set the URL for the taxonomy database used by taxaPlease"
     )
@@ -108,95 +101,222 @@ def init_argparser():
         action="store_true",
     )
 
+
+## subcommand -> (help text, function that adds its arguments)
+_SUBPARSERS = {
+    "taxid": ("Return a taxid", _add_taxid_arguments),
+    "record": ("Return a full taxon record", _add_record_arguments),
+    "check": ("Check metadata", _add_check_arguments),
+    "taxonomy": (
+        "Get valid taxonomy URLs and set taxaPlease to use them",
+        _add_taxonomy_arguments,
+    ),
+    "version": ("Return the taxaplease version (JSON output)", None),
+}
+
+
+def init_argparser(argv=None):
+    """
+    Builds the argument parser.
+
+    Every call only ever uses one subcommand, so only the subparser
+    named in argv (sys.argv by default) gets its arguments registered.
+    The rest are left as bare stubs so that their names still show up
+    in the help and validate as choices. If argv doesn't start with a
+    known subcommand (e.g. top level -h) everything is built.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    requested = argv[0] if argv else None
+    build_all = requested not in _SUBPARSERS
+
+    parser = argparse.ArgumentParser(
+        prog="taxaplease",
+        description="A tool for wrangling NCBI taxonomy.",
+        epilog="Subcommands have their own help available with -h",
+    )
+
+    parser.add_argument("-V", "--version", action="version", version=f"%(prog)s {tpVersion}")
+
+    ## subparsers are mutually exclusive by default
+    subparsers = parser.add_subparsers(required=True, dest="subcommand")
+
+    for name, (help_text, add_arguments) in _SUBPARSERS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+
+        if add_arguments and (build_all or name == requested):
+            add_arguments(subparser)
+
     return parser
 
 
+## argparse dest -> (TaxaPlease method, nargs of the option)
+## options that take several taxids are splatted into the method call
+_TAXID_HANDLERS = {
+    "parent": ("get_parent_taxid", None),
+    "genus": ("get_genus_taxid", None),
+    "species": ("get_species_taxid", None),
+    "superkingdom": ("get_superkingdom_taxid", None),
+    "parents_all": ("get_all_parent_taxids", None),
+    "common": ("get_common_parent_taxid", 2),
+}
+
+_RECORD_HANDLERS = {
+    "parent": ("get_parent_record", None),
+    "record": ("get_record", None),
+    "common": ("get_common_parent_record", 2),
+}
+
+_CHECK_HANDLERS = {
+    "levels_between": ("get_number_of_levels_between_taxa", 2),
+    "is_archaea": ("isArchaea", None),
+    "is_bacteria": ("isBacteria", None),
+    "is_eukaryote": ("isEukaryote", None),
+    "is_virus": ("isVirus", None),
+    "is_phage": ("isPhage", None),
+    "status": ("checkTaxidStatus", None),
+    "graph": ("print_taxonomy_graph", "*"),
+    "baltimore": ("get_baltimore_classification", None),
+}
+
+## (subcommand, flag) -> (TaxaPlease method, number of taxids it takes)
+## for the simple lookups that don't need argparse at all. --graph takes
+## any number of taxids and prints rather than returns, so it's left out.
+_FAST_DISPATCH = {
+    (subcommand, "--" + dest.replace("_", "-")): (method_name, nargs or 1)
+    for subcommand, handlers in (
+        ("taxid", _TAXID_HANDLERS),
+        ("record", _RECORD_HANDLERS),
+        ("check", _CHECK_HANDLERS),
+    )
+    for dest, (method_name, nargs) in handlers.items()
+    if nargs != "*"
+}
+
+
+def fast_parse(argv):
+    """
+    Recognises the common `<subcommand> --flag <taxid> [<taxid>]` shape
+    with plain string comparisons, so argparse stays off the hot path.
+
+    Returns a (subcommand, flag, values) tuple, or None if argv needs
+    the full argparse treatment (help, unknown or abbreviated flags,
+    --flag=value, anything that isn't a plain taxid, and so on).
+    """
+    if len(argv) < 3:
+        return None
+
+    subcommand, flag, *values = argv
+
+    dispatch = _FAST_DISPATCH.get((subcommand, flag))
+
+    if not dispatch or len(values) != dispatch[1]:
+        return None
+
+    if not all(value.isdecimal() for value in values):
+        return None
+
+    return subcommand, flag, values
+
+
+def _dispatch(args, taxapleaseObj, handlers, usage):
+    """
+    Calls the TaxaPlease method for whichever option in handlers was
+    given, or returns the usage string if none of them were
+    """
+    for dest, (method_name, nargs) in handlers.items():
+        value = getattr(args, dest)
+
+        if value:
+            method = getattr(taxapleaseObj, method_name)
+            return method(value) if nargs is None else method(*value)
+
+    return usage
+
+
 def handle_taxid_request(args, taxapleaseObj):
-    if args.parent:
-        return taxapleaseObj.get_parent_taxid(args.parent)
-    elif args.genus:
-        return taxapleaseObj.get_genus_taxid(args.genus)
-    elif args.species:
-        return taxapleaseObj.get_species_taxid(args.species)
-    elif args.superkingdom:
-        return taxapleaseObj.get_superkingdom_taxid(args.superkingdom)
-    elif args.parents_all:
-        return taxapleaseObj.get_all_parent_taxids(args.parents_all)
-    elif args.common:
-        return taxapleaseObj.get_common_parent_taxid(*args.common)
-    else:
-        return "Usage: taxaplease taxid -h"
+    return _dispatch(args, taxapleaseObj, _TAXID_HANDLERS, "Usage: taxaplease taxid -h")
 
 
 def handle_record_request(args, taxapleaseObj):
-    if args.parent:
-        return taxapleaseObj.get_parent_record(args.parent)
-    elif args.record:
-        return taxapleaseObj.get_record(args.record)
-    elif args.common:
-        return taxapleaseObj.get_common_parent_record(*args.common)
-    else:
-        return "Usage: taxaplease record -h"
+    return _dispatch(args, taxapleaseObj, _RECORD_HANDLERS, "Usage: taxaplease record -h")
 
 
 def handle_check_request(args, taxapleaseObj):
-    if args.levels_between:
-        return taxapleaseObj.get_number_of_levels_between_taxa(*args.levels_between)
-    elif args.is_archaea:
-        return taxapleaseObj.isArchaea(args.is_archaea)
-    elif args.is_bacteria:
-        return taxapleaseObj.isBacteria(args.is_bacteria)
-    elif args.is_eukaryote:
-        return taxapleaseObj.isEukaryote(args.is_eukaryote)
-    elif args.is_virus:
-        return taxapleaseObj.isVirus(args.is_virus)
-    elif args.is_phage:
-        return taxapleaseObj.isPhage(args.is_phage)
-    elif args.status:
-        return taxapleaseObj.checkTaxidStatus(args.status)
-    elif args.graph:
-        return taxapleaseObj.print_taxonomy_graph(*args.graph)
-    elif args.baltimore:
-        return taxapleaseObj.get_baltimore_classification(args.baltimore)
-    else:
-        return "Usage: taxaplease check -h"
+    return _dispatch(args, taxapleaseObj, _CHECK_HANDLERS, "Usage: taxaplease check -h")
 
 
 def handle_taxonomy_request(args, taxapleaseObj):
     if args.get:
         return taxapleaseObj.get_taxonomy_url()
     elif args.set:
-        return taxapleaseObj.set_taxonomy_url(args.set)
+        taxapleaseObj.set_taxonomy_url(args.set)
+        ## nothing to print
+        return -1
     else:
         return "Usage: taxaplease taxonomy -h"
 
 
-def main():
-    args = init_argparser().parse_args()
+## subcommand -> function that handles it
+## version is handled separately, as it doesn't need the database
+_HANDLERS = {
+    "taxid": handle_taxid_request,
+    "record": handle_record_request,
+    "check": handle_check_request,
+    "taxonomy": handle_taxonomy_request,
+}
+
+
+def print_json(result):
+    """
+    Writes result to stdout as a line of JSON, using orjson
+    if it's installed and falling back to the json module if not
+    """
+    buffer = getattr(sys.stdout, "buffer", None)
+
+    if orjson is None or buffer is None:
+        print(json.dumps(result))
+        return
+
+    ## orjson gives us bytes, which go straight to the underlying
+    ## buffer - flush first so anything printed earlier comes out first
+    sys.stdout.flush()
+    buffer.write(orjson.dumps(result) + b"\n")
+    buffer.flush()
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    ## plain lookups skip argparse entirely
+    fast_args = fast_parse(argv)
+    args = None if fast_args else init_argparser(argv).parse_args(argv)
+
+    if args and args.subcommand == "version":
+        print_json({"taxaplease_version": tpVersion})
+        return
+
+    ## imported here rather than at the top so that -h, -V and
+    ## version don't pay for loading taxaplease and its dependencies
+    from taxaplease import TaxaPlease
 
     tp = TaxaPlease()
 
-    result = None
-
-    match args.subcommand:
-        case "taxid":
-            result = handle_taxid_request(args, tp)
-        case "record":
-            result = handle_record_request(args, tp)
-        case "check":
-            result = handle_check_request(args, tp)
-        case "version":
-            result = {"taxaplease_version": tpVersion}
-        case "taxonomy":
-            handle_taxonomy_request(args, tp)
-            result = -1
-        case _:
-            raise Exception(f"Unknown subcommand {args.subcommand}")
+    if fast_args:
+        subcommand, flag, values = fast_args
+        method_name, _ = _FAST_DISPATCH[(subcommand, flag)]
+        result = getattr(tp, method_name)(*values)
+    elif args.subcommand in _HANDLERS:
+        result = _HANDLERS[args.subcommand](args, tp)
+    else:
+        raise Exception(f"Unknown subcommand {args.subcommand}")
 
     if result == -1:
         return
     else:
-        print(json.dumps(result))
+        print_json(result)
 
 
 if __name__ == "__main__":
@@ -1,42 +1,425 @@
 #!/usr/bin/env python3
+import contextlib
 import datetime
+import os
 import shutil
 import sqlite3
+import tarfile
 import tempfile
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pandas as pd  # type: ignore
 import requests  # type: ignore
+import taxaplease_data as tpData
+from taxaplease_version import SCHEMA_VERSION
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.compute as pc  # type: ignore
+    import pyarrow.csv as pacsv  # type: ignore
+except ImportError:
+    pa = None
+
+## the taxdump files we use, and the leading fields we need from each
+## taxids are comfortably below 2**31, and there are only a few dozen
+## ranks, so use the smallest dtypes that fit to save memory
+DMP_FILES = {
+    "nodes": ("nodes.dmp", {"taxid": "int32", "parent_taxid": "int32", "rank": "category"}),
+    "lineages": ("fullnamelineage.dmp", {"taxid": "int32", "name": "str"}),
+    "deleted nodes": ("delnodes.dmp", {"taxid": "int32"}),
+    "merged nodes": ("merged.dmp", {"old_taxid": "int32", "new_taxid": "int32"}),
+}
+
+## the key column is an INTEGER PRIMARY KEY, which makes it an alias
+## for the rowid - rows are stored in key order, and looking one up
+## needs no separate index
+TABLE_SCHEMAS = {
+    "taxa": (
+        "taxid INTEGER PRIMARY KEY, name TEXT, rank TEXT, parent_taxid INTEGER,"
+        " depth INTEGER, lft INTEGER, rgt INTEGER, kingdom_taxid INTEGER"
+    ),
+    "deleted_taxa": "taxid INTEGER PRIMARY KEY",
+    "merged_taxa": "old_taxid INTEGER PRIMARY KEY, new_taxid INTEGER",
+    "metadata": "key TEXT PRIMARY KEY, value TEXT",
+}
+
+## how much of the download to read at a time - the taxdump is a few
+## hundred MB, so big reads keep the number of trips through Python down
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+## how many rows to hand to sqlite at a time
+INSERT_CHUNK_SIZE = 50_000
+
+## temporary tables the dmp files are loaded into before being joined
+STAGING_SCHEMAS = {
+    "staged_nodes": (
+        "taxid INTEGER PRIMARY KEY, parent_taxid INTEGER, rank TEXT,"
+        " depth INTEGER, lft INTEGER, rgt INTEGER"
+    ),
+    "staged_lineages": "taxid INTEGER PRIMARY KEY, name TEXT",
+}
+
+## secondary indexes, built once the tables are full since that's
+## much quicker than keeping them up to date row by row
+## lookups by taxid and old_taxid already use the primary keys, and
+## rank has too few distinct values for an index to beat a scan
+TABLE_INDEXES = {
+    "idx_taxa_parent_taxid": "taxa (parent_taxid)",
+}
 
 #####################
 # Utility functions #
 #####################
 
 
-def download_file(url, *, destinationDir=None):
+def download_and_extract(url, extract_dir, members=None, validators=None):
     """
-    Nicked from https://stackoverflow.com/a/16696317
-    It's a large file so we don't just load it all into memory
+    Streams the archive at url straight into tarfile, so the compressed
+    file never has to be written to (and read back from) the disk.
 
-    A destination directory can optionally be specified
-    If not specified, we use the current working directory
+    The taxdump archive also has .zip files, which keep their index at
+    the end and so can't be streamed - those are spooled to a temporary
+    file first.
+
+    If members is given, only the files with those names are extracted,
+    and a .tar.gz stops downloading as soon as it has all of them.
+
+    validators can hold the ETag and Last-Modified headers of an earlier
+    download of url - if the server says the archive hasn't changed
+    since then, nothing is downloaded or extracted and None is returned.
+
+    Returns the ETag and Last-Modified headers of the download, so that
+    they can be passed back in as validators next time
     """
-    if not destinationDir:
-        destinationDir = Path.cwd()
+    validators = validators or {}
 
-    local_filename = Path(destinationDir, url.split("/")[-1])
+    ## only ask for the archive if it's changed since we last had it
+    request_headers = {}
+    if validators.get("etag"):
+        request_headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        request_headers["If-Modified-Since"] = validators["last_modified"]
 
-    ## NOTE the stream=True parameter below
-    with requests.get(url, stream=True) as r:
+    with requests.get(url, stream=True, headers=request_headers) as r:
         r.raise_for_status()
-        with Path.open(local_filename, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                # If you have chunk encoded response uncomment if
-                # and set chunk_size parameter to None.
-                # if chunk:
-                f.write(chunk)
 
-    return local_filename
+        if r.status_code == requests.codes.not_modified:
+            return None
+
+        response_validators = {
+            key: value
+            for key, value in (
+                ("etag", r.headers.get("ETag")),
+                ("last_modified", r.headers.get("Last-Modified")),
+            )
+            if value
+        }
+
+        ## undo any transfer encoding so we only see the archive itself
+        r.raw.decode_content = True
+
+        if url.endswith(".zip"):
+            with tempfile.TemporaryFile() as f:
+                shutil.copyfileobj(r.raw, f, length=DOWNLOAD_CHUNK_SIZE)
+                with zipfile.ZipFile(f) as zf:
+                    if members is not None:
+                        members = [name for name in zf.namelist() if name in members]
+
+                    zf.extractall(extract_dir, members=members)
+        else:
+            with tarfile.open(fileobj=r.raw, mode="r|gz", bufsize=DOWNLOAD_CHUNK_SIZE) as tf:
+                if members is None:
+                    tf.extractall(extract_dir)
+                else:
+                    remaining = set(members)
+
+                    for member in tf:
+                        if member.name in remaining:
+                            tf.extract(member, extract_dir)
+                            remaining.discard(member.name)
+
+                        if not remaining:
+                            break
+
+    return response_validators
+
+
+def read_download_validators(db_path, url):
+    """
+    Gets the ETag and Last-Modified headers recorded when the database
+    at db_path was built, as long as it was built from url by this
+    version of the schema - otherwise it needs rebuilding regardless.
+
+    Returns a dict that can be passed to download_and_extract as
+    validators, or None
+    """
+    if not Path(db_path).is_file():
+        return None
+
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+        try:
+            metadata = dict(conn.execute("SELECT key, value FROM metadata"))
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+
+    if metadata.get("ncbi_taxonomy_data_url") != url:
+        return None
+
+    if metadata.get("schema_version") != str(SCHEMA_VERSION):
+        return None
+
+    return {key: metadata[key] for key in ("etag", "last_modified") if key in metadata}
+
+
+def read_dmp(path, columns):
+    """
+    Reads the leading fields of an NCBI .dmp file into a dataframe
+    indexed by the first of them.
+
+    columns maps the name of each field to its dtype, in file order.
+
+    The dmp files use "\t|\t" between fields, so splitting on "|" and
+    treating tabs as quotes gets us clean values. pyarrow's multithreaded
+    reader is used if it's installed, otherwise pandas' own.
+    """
+    names = list(columns)
+
+    if pa is None:
+        return pd.read_csv(
+            path,
+            sep="|",
+            quotechar="\t",
+            names=names,
+            usecols=range(len(names)),
+            dtype=columns,
+            index_col=0,
+        )
+
+    fields = [f"f{i}" for i in range(len(names))]
+
+    table = pacsv.read_csv(
+        path,
+        read_options=pacsv.ReadOptions(autogenerate_column_names=True),
+        parse_options=pacsv.ParseOptions(delimiter="|", quote_char="\t", double_quote=False),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=fields, column_types=dict.fromkeys(fields, pa.string())
+        ),
+    )
+
+    ## the first field isn't quoted, so it still has its trailing tab
+    arrays = [pc.utf8_rtrim(table[fields[0]], characters="\t"), *table.columns[1:]]
+
+    ## pandas reads an empty field as missing, so do the same here
+    arrays = [pc.if_else(pc.equal(array, ""), None, array) for array in arrays]
+
+    ## pyarrow's equivalent of a pandas category is a dictionary array
+    table = pa.table(
+        {
+            name: array.dictionary_encode()
+            if dtype == "category"
+            else array.cast(pa.type_for_alias(dtype))
+            for name, array, dtype in zip(names, arrays, columns.values(), strict=True)
+        }
+    )
+
+    df = table.to_pandas(split_blocks=True, self_destruct=True).set_index(names[0])
+
+    ## match the rest of what pandas gives - an index of the asked for
+    ## dtype, and categories in sorted rather than first seen order
+    df.index = df.index.astype(columns[names[0]])
+
+    for name, dtype in columns.items():
+        if dtype == "category" and name in df.columns:
+            df[name] = df[name].cat.reorder_categories(sorted(df[name].cat.categories))
+
+    return df
+
+
+def iter_row_chunks(df, chunksize=INSERT_CHUNK_SIZE):
+    """
+    Yields the rows of a dataframe, index first, as lists of tuples
+    of plain python values - chunksize rows at a time, so only one
+    chunk's worth of python objects is alive at once.
+
+    Converting whole columns with tolist is much quicker than
+    boxing every value separately with itertuples.
+    """
+    for start in range(0, len(df), chunksize):
+        chunk = df.iloc[start : start + chunksize]
+        columns = [chunk.index.tolist(), *(chunk[column].tolist() for column in chunk.columns)]
+
+        yield list(zip(*columns, strict=True))
+
+
+def nested_set_numbering(taxids, parent_taxids):
+    """
+    Numbers the taxonomy tree depth first, so that "is x below y"
+    becomes a comparison rather than a walk up the tree.
+
+    Every taxon gets its depth below the root, and a (lft, rgt) pair
+    that spans the lft of every taxon below it - x is at or below y
+    if y.lft <= x.lft <= y.rgt.
+
+    Taxa whose parent is missing are numbered as roots of their own.
+
+    Parameters
+    ----------
+    taxids: list
+        NCBI taxids
+    parent_taxids: list
+        The parent of each taxid, in the same order
+
+    Returns
+    -------
+    tuple
+        depth, lft and rgt lists, in the same order as taxids
+    """
+    position = {taxid: i for i, taxid in enumerate(taxids)}
+
+    roots = []
+    children = {}
+
+    for taxid, parent_taxid in zip(taxids, parent_taxids, strict=True):
+        if taxid == parent_taxid or parent_taxid not in position:
+            roots.append(taxid)
+        else:
+            children.setdefault(parent_taxid, []).append(taxid)
+
+    depth = [0] * len(taxids)
+    lft = [0] * len(taxids)
+    rgt = [0] * len(taxids)
+
+    counter = 0
+
+    for root in roots:
+        ## (taxid, depth) on the way down, (taxid, None) on the way back up
+        stack = [(root, 0)]
+
+        while stack:
+            taxid, level = stack.pop()
+            i = position[taxid]
+
+            if level is None:
+                rgt[i] = counter - 1
+                continue
+
+            depth[i] = level
+            lft[i] = counter
+            counter += 1
+
+            stack.append((taxid, None))
+            stack.extend((child, level + 1) for child in children.get(taxid, ()))
+
+    return depth, lft, rgt
+
+
+def write_database(db_path, nodes_df, lineages_df, deleted_ids_df, merged_ids_df, metadata):
+    """
+    Writes the parsed taxdump to a new sqlite database at db_path,
+    which should either not exist yet or be an empty file.
+
+    Parameters
+    ----------
+    db_path: str or Path
+        Where to create the database
+    nodes_df: pandas.DataFrame
+        nodes.dmp, numbered with nested_set_numbering
+    lineages_df: pandas.DataFrame
+        fullnamelineage.dmp
+    deleted_ids_df: pandas.DataFrame
+        delnodes.dmp
+    merged_ids_df: pandas.DataFrame
+        merged.dmp
+    metadata: dict
+        Keys and values to record in the metadata table
+    """
+    ## transactions are handled explicitly below
+    conn = sqlite3.connect(db_path, isolation_level=None)
+
+    ## the file is thrown away if anything goes wrong,
+    ## so there's no need to sync or keep a rollback journal on disk
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA journal_mode = MEMORY")
+
+    ## keep the staging tables, the join and the index sort in memory
+    ## with a 256 MiB page cache - these only last as long as conn does
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -262144")
+
+    ## bigger pages mean a shallower b-tree for the taxa table - this has
+    ## to be set before any tables are created
+    conn.execute("PRAGMA page_size = 8192")
+
+    ## push the result to the database
+    conn.execute("BEGIN")
+
+    for table_name, columns in TABLE_SCHEMAS.items():
+        conn.execute(f"CREATE TABLE {table_name} ({columns})")
+
+    ## the nodes and lineages are staged separately and joined by sqlite,
+    ## rather than aligning two dataframes the size of the whole taxonomy
+    for table_name, columns in STAGING_SCHEMAS.items():
+        conn.execute(f"CREATE TEMP TABLE {table_name} ({columns})")
+
+    for table_name, df in (
+        ("staged_nodes", nodes_df),
+        ("staged_lineages", lineages_df),
+        ("deleted_taxa", deleted_ids_df),
+        ("merged_taxa", merged_ids_df),
+    ):
+        print(f"{datetime.datetime.now()} Writing {table_name} table to taxa.db")
+        placeholders = ", ".join("?" * (len(df.columns) + 1))
+        for rows in iter_row_chunks(df):
+            conn.executemany(f"INSERT INTO {table_name} VALUES ({placeholders})", rows)
+
+    ## each taxon is also tagged with the kingdom it sits under (if any),
+    ## found by the nested set numbering of the kingdoms' own nodes
+    print(f"{datetime.datetime.now()} Joining nodes and lineages into the taxa table")
+    kingdom_placeholders = ", ".join("?" * len(tpData.KINGDOMS))
+    conn.execute(
+        f"""
+        INSERT INTO taxa
+        SELECT
+            node.taxid, lineage.name, node.rank, node.parent_taxid,
+            node.depth, node.lft, node.rgt, kingdom.taxid
+        FROM staged_nodes AS node
+        LEFT JOIN staged_lineages AS lineage
+            ON lineage.taxid = node.taxid
+        LEFT JOIN staged_nodes AS kingdom
+            ON kingdom.taxid IN ({kingdom_placeholders})
+            AND node.lft BETWEEN kingdom.lft AND kingdom.rgt
+        ORDER BY node.taxid
+        """,
+        list(tpData.KINGDOMS),
+    )
+
+    for table_name in STAGING_SCHEMAS:
+        conn.execute(f"DROP TABLE {table_name}")
+
+    for index_name, columns in TABLE_INDEXES.items():
+        print(f"{datetime.datetime.now()} Creating index {index_name}")
+        conn.execute(f"CREATE INDEX {index_name} ON {columns}")
+
+    conn.executemany("INSERT INTO metadata VALUES (?, ?)", metadata.items())
+
+    conn.execute("COMMIT")
+
+    ## gather statistics for the query planner and compact the file,
+    ## then switch to write-ahead logging so readers never block
+    ## each other - unlike the pragmas above this one persists
+    print(f"{datetime.datetime.now()} Optimising taxa.db")
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
 
 
 def main(
@@ -49,98 +432,105 @@ def main(
     # Downloading and extracting the data #
     #######################################
 
-    ## download the data
-    print(f"{datetime.datetime.now()} Downloading {ncbi_taxonomy_data_url}")
-    ncbi_taxonomy_data_compressed = download_file(ncbi_taxonomy_data_url, destinationDir=tempdir)
+    db_dir = Path(Path.home(), ".taxaplease")
+    db_path = Path(db_dir, "taxa.db")
 
-    ## extract the archive to a subfolder
-    print(f"{datetime.datetime.now()} Extracting {ncbi_taxonomy_data_compressed}")
-    shutil.unpack_archive(ncbi_taxonomy_data_compressed, extract_dir=Path(tempdir, "new_taxdump"))
+    ## download the data and extract the files we use to a subfolder as it arrives
+    ## - unless taxa.db was already built from this exact archive
+    print(f"{datetime.datetime.now()} Downloading and extracting {ncbi_taxonomy_data_url}")
+    validators = download_and_extract(
+        ncbi_taxonomy_data_url,
+        Path(tempdir, "new_taxdump"),
+        members=[filename for filename, _ in DMP_FILES.values()],
+        validators=read_download_validators(db_path, ncbi_taxonomy_data_url),
+    )
 
-    ## technically I think you could download the stream straight into
-    ## the gzip extrator, but this works.
+    if validators is None:
+        print(f"{datetime.datetime.now()} Unchanged since taxa.db was built, nothing to do")
+        return
 
     ##################################
     # Processing the downloaded data #
     ##################################
 
-    ## get half the required info
-    print(f"{datetime.datetime.now()} Processing nodes (file 1/2)")
-    taxid_to_rank_df = pd.read_csv(
-        Path(tempdir, "new_taxdump", "nodes.dmp"),
-        sep="|",
-        quotechar="\t",
-        index_col=0,
-        names=["taxid", "parent_taxid", "rank"],
-        usecols=["taxid", "parent_taxid", "rank"],
-    )
+    taxdump_dir = Path(tempdir, "new_taxdump")
+
+    ## the files are independent, and both parsers release the GIL,
+    ## so read them all at once
+    print(f"{datetime.datetime.now()} Processing {', '.join(DMP_FILES)}")
+    with ThreadPoolExecutor(max_workers=len(DMP_FILES)) as executor:
+        futures = {
+            name: executor.submit(read_dmp, Path(taxdump_dir, filename), columns)
+            for name, (filename, columns) in DMP_FILES.items()
+        }
 
-    ## get the other half
-    print(f"{datetime.datetime.now()} Processing lineages (file 2/2)")
-    taxid_to_name_df = pd.read_csv(
-        Path(tempdir, "new_taxdump", "fullnamelineage.dmp"),
-        sep="|",
-        quotechar="\t",
-        index_col=0,
-        names=["name", "_", "__"],
-    ).drop(["_", "__"], axis=1)
-
-    ## join the halves together on taxid
-    print(f"{datetime.datetime.now()} Joining nodes and lineages")
-    concat_df = pd.concat([taxid_to_rank_df, taxid_to_name_df], axis=1)[
-        ["name", "rank", "parent_taxid"]
-    ]
-
-    ## prep the deleted ids table
-    print(f"{datetime.datetime.now()} Processing deleted nodes")
-    deleted_ids_df = pd.read_csv(
-        Path(tempdir, "new_taxdump", "delnodes.dmp"),
-        sep="|",
-        index_col=0,
-        quotechar="\t",
-        names=["taxid", "_"],
-    ).drop("_", axis=1)
-
-    ## prep the merged ids table
-    print(f"{datetime.datetime.now()} Processing merged nodes")
-    merged_ids_df = pd.read_csv(
-        Path(tempdir, "new_taxdump", "merged.dmp"),
-        sep="|",
-        index_col=0,
-        quotechar="\t",
-        names=["old_taxid", "new_taxid", "_"],
-    ).drop("_", axis=1)
+        taxid_to_rank_df = futures["nodes"].result()
+        taxid_to_name_df = futures["lineages"].result()
+        deleted_ids_df = futures["deleted nodes"].result()
+        merged_ids_df = futures["merged nodes"].result()
+
+    ## number the tree so that ancestor checks don't need to walk it
+    print(f"{datetime.datetime.now()} Numbering the taxonomy tree")
+    taxid_to_rank_df["depth"], taxid_to_rank_df["lft"], taxid_to_rank_df["rgt"] = (
+        nested_set_numbering(
+            taxid_to_rank_df.index.tolist(), taxid_to_rank_df["parent_taxid"].tolist()
+        )
+    )
 
     ###################
     # Database ingest #
     ###################
 
-    ## create an sqlite database
+    ## build into a temporary file alongside taxa.db and only swap it
+    ## in once it's complete - a failed build leaves the old database
+    ## intact, and anything already reading it carries on undisturbed
     print(f"{datetime.datetime.now()} Staging taxa.db")
-    db_dir = Path(Path.home(), ".taxaplease")
-    db_path = Path(db_dir, "taxa.db")
-    conn = sqlite3.connect(db_path)
 
-    ## push the result to the database
-    ## should overwrite the table if exists
-    print(f"{datetime.datetime.now()} Writing taxa table to taxa.db")
-    concat_df.to_sql("taxa", con=conn, index_label="taxid", if_exists="replace")
-
-    print(f"{datetime.datetime.now()} Writing deleted_taxa table to taxa.db")
-    deleted_ids_df.to_sql("deleted_taxa", con=conn, index_label="taxid", if_exists="replace")
-
-    print(f"{datetime.datetime.now()} Writing merged_taxa table to taxa.db")
-    merged_ids_df.to_sql("merged_taxa", con=conn, index_label="old_taxid", if_exists="replace")
-
-    ## create a metadata table that contains
-    ## the current taxdatabase URL
-    metadata_table_df = (
-        pd.DataFrame([("ncbi_taxonomy_data_url", ncbi_taxonomy_data_url)])
-        .rename({0: "key", 1: "value"}, axis=1)
-        .set_index("key")
-    )
+    ## lets anything derived from this database, like the
+    ## parent arrays, tell whether it belongs to this build
+    build_id = uuid.uuid4().hex
+
+    ## created with os.open rather than mkstemp, whose files are readable
+    ## by their owner only, so the umask decides the permissions
+    staging_path = Path(db_dir, f"taxa.db.{build_id}.tmp")
+    os.close(os.open(staging_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666))
+
+    try:
+        write_database(
+            staging_path,
+            taxid_to_rank_df,
+            taxid_to_name_df,
+            deleted_ids_df,
+            merged_ids_df,
+            ## record where the data came from, so that we know
+            ## when it needs updating
+            {
+                "ncbi_taxonomy_data_url": ncbi_taxonomy_data_url,
+                "schema_version": str(SCHEMA_VERSION),
+                "build_id": build_id,
+                **validators,
+            },
+        )
+    except BaseException:
+        Path(staging_path).unlink(missing_ok=True)
+        raise
+
+    ## a write-ahead log left behind by the old database must
+    ## never be replayed into the new one
+    for suffix in ("-wal", "-shm"):
+        Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+
+    Path(staging_path).replace(db_path)
+
+    ## the arrays saved alongside the old database aren't needed any more -
+    ## a process still using it has them mapped already, or saves them
+    ## again if they've gone by the time it gets to them
+    for stale_path in Path(db_dir).glob("taxa-*.npy"):
+        if stale_path.name.startswith(f"taxa-{build_id}-"):
+            continue
 
-    metadata_table_df.to_sql("metadata", con=conn, index_label="key", if_exists="replace")
+        with contextlib.suppress(OSError):
+            stale_path.unlink()
 
     print(f"{datetime.datetime.now()} Done in {datetime.datetime.now() - start_time}")
 
@@ -1,16 +1,341 @@
+import contextlib
 import functools
+import operator
+import os
+import queue
+import re
 import sqlite3
 import tempfile
-from pathlib import Path
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
 from urllib.parse import urljoin
 
 import networkx as nx  # type: ignore
+import numpy as np  # type: ignore
 import requests  # type: ignore
-from bs4 import BeautifulSoup as bs  # type: ignore
 
 import taxaplease_data as tpData
+from taxaplease_version import SCHEMA_VERSION
+from taxaplease_version import __version__  # noqa: F401
+
+## the single row lookups, which are run far more often than anything else
+_RECORD_SQL = "SELECT taxid, name, rank, parent_taxid FROM taxa WHERE taxid = ?"
+_PARENT_RECORD_SQL = """
+    SELECT parent.taxid, parent.name, parent.rank, parent.parent_taxid
+    FROM taxa AS child JOIN taxa AS parent ON parent.taxid = child.parent_taxid
+    WHERE child.taxid = ?
+"""
+
+## settings for each connection - none of these persist in the file
+## keep up to 64 MiB of pages cached and read the rest through a memory
+## map rather than read() calls, and keep any temporary results in memory
+_CONNECTION_PRAGMAS = (
+    "cache_size = -65536",
+    "mmap_size = 268435456",
+    "temp_store = MEMORY",
+)
+
+## names for a batch of taxids, with a placeholder per taxid filled in -
+## batches are kept well under SQLite's limit on the number of parameters
+_NAMES_SQL = "SELECT taxid, name FROM taxa WHERE taxid IN ({placeholders})"
+_NAMES_BATCH_SIZE = 500
+
+## links to taxdump archives in the NCBI directory listings
+_TAXDUMP_HREF_RE = re.compile(r'href="([^"]+\.(?:zip|tar\.gz))"')
+
+## how many records each instance remembers
+_LOOKUP_CACHE_SIZE = 65536
+
+## how many walks up the tree a process makes before it
+## switches to the versions compiled with numba
+_JIT_THRESHOLD = 1000
+
+## codes for the ranks that get climbed to, used while building the
+## arrays - any other rank is 0, and a record without a rank stops a climb
+_RANK_CODES = {"species": 1, "genus": 2, "superkingdom": 3}
+_NO_RANK_CODE = -1
+
+_RANK_CASES = " ".join(f"WHEN '{rank}' THEN {code}" for rank, code in _RANK_CODES.items())
+
+## a bit for each kingdom in the kingdom array, set if a taxon is under it
+_KINGDOM_BITS = {taxid: 1 << i for i, taxid in enumerate(tpData.KINGDOMS)}
+
+_KINGDOM_CASES = " ".join(f"WHEN {taxid} THEN {bit}" for taxid, bit in _KINGDOM_BITS.items())
+
+## the parent taxid, rank code, depth and kingdom bit of every taxon,
+## for the parent arrays
+_ARRAYS_SQL = f"""
+    SELECT taxid, parent_taxid, CASE coalesce(rank, '')
+        WHEN '' THEN {_NO_RANK_CODE} {_RANK_CASES} ELSE 0
+    END, coalesce(depth, 0), CASE kingdom_taxid {_KINGDOM_CASES} ELSE 0 END
+    FROM taxa
+"""
+
+## the arrays saved alongside the database - see TaxaPlease._init_arrays
+_ARRAY_NAMES = (
+    "parent",
+    "depth",
+    "kingdom",
+    *_RANK_CODES,
+    "status-taxid",
+    "status",
+)
+
+## for creating the arrays' temporary files - O_EXCL so that two
+## processes never write to the same one
+_NEW_FILE_FLAGS = os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, "O_BINARY", 0)
+
+## every deleted and merged taxid, with -1 for a deleted one and the new
+## taxid for a merged one, for the status arrays
+_STATUS_ARRAYS_SQL = """
+    SELECT taxid, -1 FROM deleted_taxa
+    UNION ALL
+    SELECT old_taxid, new_taxid FROM merged_taxa
+    ORDER BY 1
+"""
+
+
+def _climb_array(parent, taxid):
+    """
+    Follows the parent array up from a taxid that's in the database,
+    returning an array of each parent in turn up to the root - stopping
+    early at a parent that isn't in the database. Only used compiled,
+    as indexing an array an element at a time is slow in plain Python.
+    """
+    size = parent.shape[0]
+    parents = np.empty(64, dtype=np.int64)
+    n = 0
+
+    while True:
+        taxid = parent[taxid]
+
+        if n == parents.shape[0]:
+            grown = np.empty(2 * n, dtype=np.int64)
+            grown[:n] = parents
+            parents = grown
+
+        parents[n] = taxid
+        n += 1
+
+        if taxid == 1 or not (0 < taxid < size and parent[taxid] != 0):
+            return parents[:n]
+
+
+def _climb(parent, taxid: int) -> list:
+    """
+    Same walk as _climb_array, as a list of ints - compiled once the
+    process has made enough calls (see _JitKernels), or reading the
+    array with .item() until then
+    """
+    climb_jit = _JIT_KERNELS.get("_climb_array")
+
+    if climb_jit is not None:
+        return climb_jit(parent, taxid).tolist()
+
+    size = len(parent)
+    parents = []
+
+    while True:
+        taxid = parent.item(taxid)
+        parents.append(taxid)
+
+        if taxid == 1 or not (0 < taxid < size and parent.item(taxid)):
+            return parents
+
+
+def _taxids_at_rank(parent, rank, depth, taxids, code: int):
+    """
+    For every taxon, finds the first taxon at or above it with the given
+    rank code, or 0 if the climb hits the root, a record without a rank
+    or a parent that isn't in the database first.
+
+    Every taxon's answer is either itself, nothing, or its parent's
+    answer, so the taxa are worked through a level at a time from the
+    root down, a whole level per array operation.
+    """
+    size = len(parent)
+    result = np.zeros(size, dtype=np.int32)
+
+    taxids = taxids[np.argsort(depth[taxids], kind="stable")]
+    levels = np.searchsorted(depth[taxids], np.arange(depth.max() + 2))
+
+    for start, end in zip(levels[:-1], levels[1:], strict=True):
+        level = taxids[start:end]
+
+        parents = parent[level].astype(np.int64)
+        inherited = np.zeros(len(level), dtype=np.int32)
+        in_range = (parents > 0) & (parents < size)
+        inherited[in_range] = result[parents[in_range]]
+
+        codes = rank[level]
+        stop = (codes == _NO_RANK_CODE) | (level == 1)
+
+        result[level] = np.where(codes == code, level, np.where(stop, 0, inherited))
 
-__version__ = "1.1.0"
+    return result
+
+
+def _lowest_common_parent_array(parent, depth, left, right):
+    """
+    Same climb as _lowest_common_parent, indexing the arrays directly
+    and returning a common parent of 0 if there isn't one. Only used
+    compiled, like _climb_array.
+    """
+    size = parent.shape[0]
+    left_levels = 0
+    right_levels = 0
+
+    while left != right:
+        left_top = left == 1 or not (0 < left < size and parent[left] != 0)
+        right_top = right == 1 or not (0 < right < size and parent[right] != 0)
+
+        if left_top and right_top:
+            return 0, left_levels, right_levels
+
+        left_depth = -1 if left_top and left != 1 else depth[left]
+        right_depth = -1 if right_top and right != 1 else depth[right]
+
+        if left_depth >= right_depth and not left_top:
+            left = parent[left]
+            left_levels += 1
+
+        if right_depth >= left_depth and not right_top:
+            right = parent[right]
+            right_levels += 1
+
+    return left, left_levels, right_levels
+
+
+def _lowest_common_parent(parent, depth, left: int, right: int) -> tuple | None:
+    """
+    Finds the first parent two taxids share by climbing whichever of
+    them is deeper in the tree, then both together, until they meet.
+
+    The root and any parent that isn't in the database are the tops of
+    their chains - if both taxids reach different tops there's no
+    common parent. Taxids that aren't in the database count as one
+    level above the root, so they only ever meet themselves.
+
+    Returns a (common parent, levels up from left, levels up from right)
+    tuple, or None. Compiled once there have been enough calls, like _climb.
+    """
+    lowest_common_parent_jit = _JIT_KERNELS.get("_lowest_common_parent_array")
+
+    if lowest_common_parent_jit is not None:
+        result = lowest_common_parent_jit(parent, depth, left, right)
+        return result if result[0] else None
+
+    size = len(parent)
+    left_levels = right_levels = 0
+
+    while left != right:
+        left_top = left == 1 or not (0 < left < size and parent.item(left))
+        right_top = right == 1 or not (0 < right < size and parent.item(right))
+
+        if left_top and right_top:
+            return None
+
+        left_depth = -1 if left_top and left != 1 else depth.item(left)
+        right_depth = -1 if right_top and right != 1 else depth.item(right)
+
+        if left_depth >= right_depth and not left_top:
+            left = parent.item(left)
+            left_levels += 1
+
+        if right_depth >= left_depth and not right_top:
+            right = parent.item(right)
+            right_levels += 1
+
+    return left, left_levels, right_levels
+
+
+class _JitKernels:
+    """
+    The array kernels compiled with numba, if it's installed.
+
+    Importing numba and loading the kernels from its on disk cache
+    takes a few hundred ms, far longer than a handful of lookups take
+    through the plain Python walks - so nothing is loaded until the
+    process has asked for a kernel enough times for it to pay off.
+    A CLI call never gets there.
+    """
+
+    def __init__(self, threshold: int):
+        self._threshold = threshold
+        self._calls = 0
+        self._kernels = None
+        self._lock = threading.Lock()
+
+    def get(self, name: str):
+        """
+        Returns the compiled version of the named kernel,
+        or None if the plain Python walk should be used
+        """
+        if self._kernels is None:
+            self._calls += 1
+
+            if self._calls < self._threshold:
+                return None
+
+            with self._lock:
+                if self._kernels is None:
+                    self._kernels = self._load()
+
+        return self._kernels.get(name)
+
+    @staticmethod
+    def _load() -> dict:
+        try:
+            from numba import njit  # type: ignore
+        except ImportError:
+            return {}
+
+        ## compiled on first use, and cached on disk after that
+        return {
+            kernel.__name__: njit(cache=True)(kernel)
+            for kernel in (_climb_array, _lowest_common_parent_array)
+        }
+
+
+_JIT_KERNELS = _JitKernels(_JIT_THRESHOLD)
+
+
+class _ConnectionPool:
+    """
+    Read-only connections to the database, for use by threads other
+    than the one that created the TaxaPlease object - an sqlite3
+    connection can only be used by the thread that opened it, but any
+    number of connections can read the database at once.
+
+    Connections are opened the first time they're needed, and put back
+    in the pool for the next thread after that.
+    """
+
+    def __init__(self, db_path, configure):
+        self._db_uri = f"{Path(db_path).as_uri()}?mode=ro"
+        self._configure = configure
+        self._idle = queue.SimpleQueue()
+
+    @contextlib.contextmanager
+    def borrow(self):
+        try:
+            con = self._idle.get_nowait()
+        except queue.Empty:
+            con = self._configure(sqlite3.connect(self._db_uri, uri=True, check_same_thread=False))
+
+        try:
+            yield con
+        finally:
+            self._idle.put(con)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
 
 
 class TaxaPlease:
@@ -18,16 +343,97 @@ class TaxaPlease:
     Class for wrangling NCBI taxids
     """
 
+    ## every attribute an instance sets, so that there's no per-instance
+    ## __dict__ and the lookups on the hot paths are slot reads
+    __slots__ = (
+        "con",
+        "_cur_record",
+        "_cur_parent_record",
+        "_cur_names",
+        "_owner_thread",
+        "_pool",
+        "_parent",
+        "_depth",
+        "_kingdom",
+        "_taxid_at_rank",
+        "_status_taxid",
+        "_status",
+        "_fetch_record",
+        "_fetch_lowest_common_parent",
+        "_phages",
+        "_phage_set",
+        "_baltimore",
+        "_baltimore_set",
+        "viral_realms",
+        "__weakref__",
+    )
+
     def __init__(self):
         self.con = self._init_database_connection()
-        self.column_names = self._init_column_names()
+        self._init_cursors()
+        self._init_pool()
+        self._init_arrays()
+        self._init_caches()
         self.phages = tpData.PHAGES
         self.baltimore = tpData.BALTIMORE_CLASSIFICATION
         self.viral_realms = tpData.VIRAL_REALMS
 
+    def __getstate__(self) -> dict:
+        """
+        Pickles as just the lookups that can be overridden. The
+        connections and arrays are reopened on the other side, which is
+        cheap once the database and arrays exist on disk, so a
+        TaxaPlease object can be handed to worker processes.
+        """
+        return {
+            "phages": self.phages,
+            "baltimore": self.baltimore,
+            "viral_realms": self.viral_realms,
+        }
+
+    def __setstate__(self, state: dict):
+        self.__init__()
+        self.phages = state["phages"]
+        self.baltimore = state["baltimore"]
+        self.viral_realms = state["viral_realms"]
+
+    @property
+    def phages(self) -> dict:
+        """
+        Lookup of phage taxids, used by isPhage.
+
+        Assigning a new dict also refreshes the set of taxids that
+        isPhage checks against, so override it by assignment rather
+        than by editing the dict in place.
+        """
+        return self._phages
+
+    @phages.setter
+    def phages(self, value: dict):
+        self._phages = value
+        self._phage_set = frozenset(value)
+
+    @property
+    def baltimore(self) -> dict:
+        """
+        Lookup of Baltimore classifications, used by
+        get_baltimore_classification. Like phages, override it by
+        assigning a new dict.
+        """
+        return self._baltimore
+
+    @baltimore.setter
+    def baltimore(self, value: dict):
+        self._baltimore = value
+        self._baltimore_set = frozenset(value)
+
+    @staticmethod
+    def _get_database_path() -> Path:
+        return Path(Path.home(), ".taxaplease", "taxa.db")
+
     def _init_database_connection(self):
-        db_dir = Path(Path.home(), ".taxaplease")
-        db_path = Path(db_dir, "taxa.db")
+        db_path = self._get_database_path()
+        db_dir = db_path.parent
 
         ## if the folder doesn't exist, create it
         if not Path.is_dir(db_dir):
@@ -37,7 +443,45 @@ class TaxaPlease:
         if not Path.is_file(db_path):
             self._create_database()
 
-        return sqlite3.connect(db_path)
+        con = sqlite3.connect(db_path)
+
+        ## databases built by an older version are missing tables or
+        ## columns we rely on, so rebuild them from the same taxonomy
+        if self._get_metadata(con, "schema_version") != str(SCHEMA_VERSION):
+            taxonomy_url = self._get_metadata(con, "ncbi_taxonomy_data_url")
+            con.close()
+
+            self._create_database(taxonomy_url)
+            con = sqlite3.connect(db_path)
+
+        return self._configure_connection(con)
+
+    @staticmethod
+    def _configure_connection(con):
+        ## rows can be indexed by column name as well as position, and turn
+        ## straight into record dicts without zipping in the column names
+        con.row_factory = sqlite3.Row
+
+        for pragma in _CONNECTION_PRAGMAS:
+            con.execute(f"PRAGMA {pragma}")
+
+        return con
+
+    @staticmethod
+    def _get_metadata(con, key: str) -> str | None:
+        """
+        Gets a value from the metadata table, or None if
+        either the key or the table itself is missing
+        """
+        try:
+            res = con.execute("SELECT value FROM metadata WHERE key = ?", [key]).fetchone()
+        except sqlite3.OperationalError:
+            return None
+
+        if res:
+            return res[0]
+        else:
+            return None
 
     def _create_database(self, taxonomy_url=None):
         import database_generation.generate_database as gd
@@ -50,18 +494,305 @@ class TaxaPlease:
                 ## else use the latest
                 gd.main(tempdir)
 
-    def _init_column_names(self) -> list:
+    def _init_cursors(self):
+        """
+        Creates a long-lived cursor for each of the lookups, so that
+        they don't need a new cursor every call.
+        sqlite3 keeps the prepared statements themselves in the
+        connection's statement cache.
+
+        Results are read with fetchall rather than fetchone, which steps
+        the statement through to the end and resets it - an unfinished
+        statement would hold a read transaction open between calls.
+        """
+        self._cur_record = self.con.cursor()
+        self._cur_parent_record = self.con.cursor()
+        self._cur_names = self.con.cursor()
+
+    def _init_pool(self):
+        """
+        Records which thread owns self.con, and sets up the pool of
+        connections that any other threads use instead
         """
-        Creates a cursor, sends a query to the database that
-        returns 0 rows, and apparently that's enough to get the
-        column names
+        self._owner_thread = threading.get_ident()
+        self._pool = _ConnectionPool(self._get_database_path(), self._configure_connection)
+
+    def _fetchall(self, cursor, sql: str, parameters) -> list:
+        """
+        Runs a query and returns all of its rows. The thread that created
+        this object uses the given long-lived cursor, any other thread
+        borrows a read-only connection from the pool.
+        """
+        if threading.get_ident() == self._owner_thread:
+            return cursor.execute(sql, parameters).fetchall()
+
+        with self._pool.borrow() as con:
+            return con.execute(sql, parameters).fetchall()
+
+    def _init_arrays(self):
+        """
+        Maps in the parent taxid, depth and kingdom bit of every taxon
+        as flat arrays indexed by taxid, so that walking up the tree is
+        a series of array lookups rather than a query per level, and the
+        kingdom checks are a single lookup. Taxids that aren't in the
+        database have a parent of 0.
+
+        The species, genus and superkingdom each taxon sits under are
+        worked out up front too (see _taxids_at_rank), so looking one
+        up doesn't need a walk at all.
+
+        Deleted and merged taxids are few and far between, so rather
+        than being indexed by taxid they're kept as a sorted array of
+        taxids and an array of what happened to each - see
+        _STATUS_ARRAYS_SQL.
+
+        The arrays are built from the database the first time it's
+        opened and saved alongside it, named after the build id in the
+        metadata table so that a rebuilt database never picks up the
+        arrays of an old one.
+        """
+        db_dir = self._get_database_path().parent
+        build_id = self._get_metadata(self.con, "build_id")
+
+        paths = {name: Path(db_dir, f"taxa-{build_id}-{name}.npy") for name in _ARRAY_NAMES}
+
+        if not all(Path.is_file(path) for path in paths.values()):
+            self._save_arrays(paths)
+
+        try:
+            arrays = {name: np.load(path, mmap_mode="r") for name, path in paths.items()}
+        except FileNotFoundError:
+            ## the database was rebuilt by another process since it was
+            ## opened here, and the rebuild cleared these arrays away
+            self._save_arrays(paths)
+            arrays = {name: np.load(path, mmap_mode="r") for name, path in paths.items()}
+
+        self._parent = arrays["parent"]
+        self._depth = arrays["depth"]
+        self._kingdom = arrays["kingdom"]
+        self._taxid_at_rank = {rank: arrays[rank] for rank in _RANK_CODES}
+        self._status_taxid = arrays["status-taxid"]
+        self._status = arrays["status"]
+
+    def _save_arrays(self, paths: dict):
+        """
+        Reads the parent taxids, rank codes, depths, kingdom bits and
+        deleted and merged taxids out of the database, and saves the
+        arrays built from them to the given paths (keyed by the names
+        in _ARRAY_NAMES). The arrays of earlier databases are cleared
+        away when a new one is generated, not here, as another process
+        may still be using them.
         """
         cur = self.con.cursor()
-        cur.execute("SELECT * FROM taxa LIMIT 0")
-        return [x[0] for x in cur.description]
+        cur.row_factory = None
+
+        rows = np.fromiter(
+            cur.execute(_ARRAYS_SQL),
+            dtype=[
+                ("taxid", np.int64),
+                ("parent_taxid", np.int32),
+                ("rank", np.int8),
+                ("depth", np.int16),
+                ("kingdom", np.uint8),
+            ],
+        )
+        size = rows["taxid"].max() + 1 if len(rows) else 1
+
+        arrays = {}
+
+        for name, dtype in (
+            ("parent_taxid", np.int32),
+            ("rank", np.int8),
+            ("depth", np.int16),
+            ("kingdom", np.uint8),
+        ):
+            arrays[name] = np.zeros(size, dtype=dtype)
+            arrays[name][rows["taxid"]] = rows[name]
+
+        arrays["parent"] = arrays.pop("parent_taxid")
+
+        ## the rank codes are only needed to work these out
+        rank = arrays.pop("rank")
+
+        for rank_name, code in _RANK_CODES.items():
+            arrays[rank_name] = _taxids_at_rank(
+                arrays["parent"], rank, arrays["depth"], rows["taxid"], code
+            )
+
+        status = np.fromiter(
+            cur.execute(_STATUS_ARRAYS_SQL),
+            dtype=[("taxid", np.int64), ("status", np.int32)],
+        )
+        arrays["status-taxid"] = status["taxid"]
+        arrays["status"] = status["status"]
+
+        ## written to a temporary file and moved into place, so that
+        ## another process never maps a half written array - created
+        ## with os.open rather than mkstemp, whose files are readable by
+        ## their owner only, so the umask decides the permissions
+        for name, path in paths.items():
+            temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+            fd = os.open(temp_path, _NEW_FILE_FLAGS, 0o666)
+
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, arrays[name])
+
+            temp_path.replace(path)
+
+    @staticmethod
+    def _norm(inputTaxid: int | str) -> int | str:
+        """
+        Turns a taxid into an int, so that 562, "562" and 562.0 are
+        looked up, cached and compared the same way everywhere. Only
+        values that really are whole numbers are converted - anything
+        else (562.9, True, "abc") is passed through as is, and won't
+        match any taxid.
+        """
+        ## bools are ints as far as Python is concerned, but not taxids
+        if isinstance(inputTaxid, bool | np.bool_):
+            return inputTaxid
+
+        if isinstance(inputTaxid, str):
+            return int(inputTaxid) if inputTaxid.strip().isdecimal() else inputTaxid
+
+        if isinstance(inputTaxid, float):
+            return int(inputTaxid) if inputTaxid.is_integer() else inputTaxid
+
+        try:
+            return operator.index(inputTaxid)
+        except TypeError:
+            return inputTaxid
+
+    @staticmethod
+    def _is_taxid(inputTaxid) -> bool:
+        """
+        Whether a taxid that's been through _norm could match anything -
+        a positive int small enough for SQLite to bind
+        """
+        return (
+            isinstance(inputTaxid, int)
+            and not isinstance(inputTaxid, bool)
+            and 0 < inputTaxid < 2**63
+        )
+
+    def _taxid_index(self, inputTaxid: int | str) -> int | None:
+        """
+        Turns a taxid that's been through _norm into an index into the
+        parent arrays, or None if it isn't in the database
+        """
+        if not self._is_taxid(inputTaxid):
+            return None
+
+        if inputTaxid < len(self._parent) and self._parent.item(inputTaxid):
+            return inputTaxid
+        else:
+            return None
+
+    def _taxid_indices(self, inputTaxids) -> tuple:
+        """
+        Turns any number of taxids into an int64 array, along with a
+        mask of which of them are indexes into the parent arrays.
+
+        Anything other than an array of ints (strings, floats, a mix)
+        goes through _taxid_index one at a time, so each value is
+        treated exactly as it would be on its own - "x" or 562.9 is
+        just not found, rather than raising or being truncated.
+        """
+        taxids = np.asarray(inputTaxids).reshape(-1)
+
+        if taxids.dtype.kind in "iu":
+            taxids = taxids.astype(np.int64, copy=False)
+        else:
+            taxids = np.fromiter(
+                (self._taxid_index(self._norm(taxid)) or 0 for taxid in taxids.tolist()),
+                dtype=np.int64,
+                count=len(taxids),
+            )
+
+        found = (taxids > 0) & (taxids < len(self._parent))
+        found[found] = self._parent[taxids[found]] != 0
+
+        return taxids, found
+
+    def _get_lineage(self, inputTaxid: int | str) -> list:
+        """
+        Gets the input taxid, then each of its parents in turn up to
+        the root. Stops early at a parent that isn't in the database.
+        """
+        taxid = self._taxid_index(inputTaxid)
+
+        ## the root is its own parent
+        if taxid is None or taxid == 1:
+            return [inputTaxid]
+
+        return [inputTaxid, *_climb(self._parent, taxid)]
+
+    def _get_lowest_common_parent(self, inputTaxidLeft: int | str, inputTaxidRight: int | str):
+        """
+        Finds the first parent two taxids share, along with the number
+        of levels up to it from each side, or None if there isn't one
+        """
+        if inputTaxidLeft == inputTaxidRight:
+            return inputTaxidLeft, 0, 0
+
+        ## anything that isn't a positive int32 can't be anyone's parent
+        for taxid in (inputTaxidLeft, inputTaxidRight):
+            if not (self._is_taxid(taxid) and 0 < taxid < 2**31):
+                return None
+
+        ## the answer is the same either way round, with the level
+        ## counts swapped, so only the ascending pair is cached
+        if inputTaxidLeft < inputTaxidRight:
+            return self._fetch_lowest_common_parent(inputTaxidLeft, inputTaxidRight)
+
+        result = self._fetch_lowest_common_parent(inputTaxidRight, inputTaxidLeft)
+
+        if result is None:
+            return None
+
+        taxid, right_levels, left_levels = result
+        return taxid, left_levels, right_levels
+
+    def _find_lowest_common_parent(self, inputTaxidLeft: int, inputTaxidRight: int):
+        return _lowest_common_parent(self._parent, self._depth, inputTaxidLeft, inputTaxidRight)
+
+    def _init_caches(self):
+        """
+        Memoises the record and common parent lookups for this instance,
+        as walks over related taxa keep coming back to the same
+        ancestors, and get_common_parent_record and
+        get_number_of_levels_between_taxa are often asked about the same
+        pair of taxa.
+
+        Records are cached as dicts and get_record hands out a copy, so
+        callers are free to modify what they get back - copying a dict
+        is several times quicker than building one from a sqlite3.Row.
+        """
+        self._fetch_record = functools.lru_cache(maxsize=_LOOKUP_CACHE_SIZE)(self._query_record)
+        self._fetch_lowest_common_parent = functools.lru_cache(maxsize=_LOOKUP_CACHE_SIZE)(
+            self._find_lowest_common_parent
+        )
+
+    def _query_record(self, inputTaxid: int | str) -> dict | None:
+        res = self._fetchall(self._cur_record, _RECORD_SQL, [inputTaxid])
+
+        if res:
+            return dict(res[0])
+        else:
+            return None
 
     def set_taxonomy_url(self, url: str):
+        ## let go of the database while it's rebuilt
+        self._pool.close()
+        self.con.close()
         self._create_database(url)
+        self.con = self._init_database_connection()
+        self._init_cursors()
+        self._init_pool()
+        self._init_arrays()
+
+        ## anything remembered came from the old database
+        self._init_caches()
 
         return None
 
@@ -72,8 +803,8 @@ class TaxaPlease:
 
         Parameters
         ----------
-        file_listing: list
-            A list of <a> tags from a beautifulsoup findall query
+        file_listing: str
+            HTML of a directory listing page
         url: str
             A URL to be added to the front of the filename in the file listing
 
@@ -82,14 +813,11 @@ class TaxaPlease:
         List
             A list of absolute URLs
         """
-        relative_url_list = list(
-            filter(
-                lambda x: x.endswith(".zip") or x.endswith(".tar.gz"),
-                (x.get("href") for x in file_listing),
-            )
-        )
+        ## the listing is a flat list of links, so there's no
+        ## need to parse the HTML just to pick out the archives
+        relative_url_list = _TAXDUMP_HREF_RE.findall(file_listing)
 
-        absolute_url_list = [urljoin(url, Path.name(x)) for x in relative_url_list]
+        absolute_url_list = [urljoin(url, PurePosixPath(x).name) for x in relative_url_list]
 
         return absolute_url_list
 
@@ -103,15 +831,17 @@ class TaxaPlease:
         taxdump_archive_page = "https://ftp.ncbi.nih.gov/pub/taxonomy/taxdump_archive/"
         taxdump_latest_page = "https://ftp.ncbi.nih.gov/pub/taxonomy/new_taxdump/"
 
-        td_archive = bs(requests.get(taxdump_archive_page).text, features="html.parser")
-        td_latest = bs(requests.get(taxdump_latest_page).text, features="html.parser")
+        ## fetch both pages at once, over a shared session
+        ## so the connection to NCBI can be reused
+        with requests.Session() as session, ThreadPoolExecutor(max_workers=2) as executor:
+            archive_future = executor.submit(session.get, taxdump_archive_page)
+            latest_future = executor.submit(session.get, taxdump_latest_page)
 
-        file_listing_archive = self.__process_file_listing(
-            td_archive.find_all(name="a"), taxdump_archive_page
-        )
-        file_listing_latest = self.__process_file_listing(
-            td_latest.find_all(name="a"), taxdump_latest_page
-        )
+            td_archive = archive_future.result().text
+            td_latest = latest_future.result().text
+
+        file_listing_archive = self.__process_file_listing(td_archive, taxdump_archive_page)
+        file_listing_latest = self.__process_file_listing(td_latest, taxdump_latest_page)
 
         available_taxdump_files = {
             "latest": file_listing_latest,
@@ -135,14 +865,38 @@ class TaxaPlease:
         Optional[int]
             Parent NCBI taxid or None
         """
-        cur = self.con.cursor()
-        res = cur.execute("SELECT parent_taxid FROM taxa WHERE taxid = ?", [inputTaxid]).fetchone()
+        inputTaxid = self._norm(inputTaxid)
 
-        if res:
-            return res[0]
-        else:
+        taxid = self._taxid_index(inputTaxid)
+
+        if taxid is None:
             return None
 
+        return self._parent.item(taxid)
+
+    def get_parent_taxid_many(self, inputTaxids) -> np.ndarray:
+        """
+        Takes in any number of NCBI taxids, returns the parent taxid
+        of each of them, looked up in one go rather than one by one.
+
+        Parameters
+        ----------
+        inputTaxids : array-like of int or str
+            NCBI taxids
+
+        Returns
+        -------
+        np.ndarray
+            Parent NCBI taxid of each taxid, in the same order,
+            with 0 for any taxid that isn't in the database
+        """
+        taxids, found = self._taxid_indices(inputTaxids)
+
+        parents = np.zeros(len(taxids), dtype=np.int64)
+        parents[found] = self._parent[taxids[found]]
+
+        return parents
+
     def get_record(self, inputTaxid: int | str) -> dict | None:
         """
         Takes in an NCBI taxid, returns the corresponding record
@@ -158,18 +912,23 @@ class TaxaPlease:
         Optional[dict]
             taxa database record for inputTaxid
         """
-        cur = self.con.cursor()
-        res = cur.execute("SELECT * FROM taxa WHERE taxid = ?", [inputTaxid]).fetchone()
+        inputTaxid = self._norm(inputTaxid)
+
+        ## anything else would be compared by SQLite's rules (True is 1)
+        if not self._is_taxid(inputTaxid):
+            return None
+
+        res = self._fetch_record(inputTaxid)
 
         if res:
-            return dict(zip(self.column_names, res, strict=False))
+            return res.copy()
         else:
             return None
 
     def get_parent_record(self, inputTaxid: int | str) -> dict | None:
         """
-        Takes in an NCBI taxid, gets the parent taxid if there is one,
-        then gets its corresponding record.
+        Takes in an NCBI taxid, gets the record of its parent
+        taxid if there is one.
 
         Will return None if there is no corresponding taxid/record
 
@@ -183,19 +942,45 @@ class TaxaPlease:
         Optional[dict]
             taxa database record for the parent of inputTaxid
         """
-        parent_taxid = self.get_parent_taxid(inputTaxid)
+        inputTaxid = self._norm(inputTaxid)
 
-        if not parent_taxid:
+        if not self._is_taxid(inputTaxid):
             return None
 
-        cur = self.con.cursor()
-        res = cur.execute("SELECT * FROM taxa WHERE taxid = ?", [parent_taxid]).fetchone()
+        ## one query, joining the taxon to its parent's record
+        res = self._fetchall(self._cur_parent_record, _PARENT_RECORD_SQL, [inputTaxid])
 
         if res:
-            return dict(zip(self.column_names, res, strict=False))
+            return dict(res[0])
         else:
             return None
 
+    def _get_taxid_at_rank(self, inputTaxid: int | str, rank: str) -> int | None:
+        """
+        Takes in an NCBI taxid, traverses up the tree until we find
+        something labelled with the given rank, or hit a brick wall
+        (the root, or a record without a rank).
+
+        Parameters
+        ----------
+        inputTaxid: int or str
+            NCBI taxid
+        rank: str
+            Rank to look for - species, genus or superkingdom
+
+        Returns
+        -------
+        Optional[int]
+            NCBI taxid at that rank
+        """
+        taxid = self._taxid_index(inputTaxid)
+
+        if taxid is None:
+            return None
+
+        ## worked out for every taxon when the arrays were built
+        return self._taxid_at_rank[rank].item(taxid) or None
+
     def get_genus_taxid(self, inputTaxid: int | str) -> int | None:
         """
         Kinda naff function that only works if your inputTaxid is
@@ -214,28 +999,11 @@ class TaxaPlease:
         Optional[int]
             NCBI taxid corresponding to the genus
         """
-        ## check we aren't already a genus
-        rec = self.get_record(inputTaxid)
-
-        if not rec:
-            return None
-
-        if rec["rank"] == "genus":
-            return inputTaxid
-
-        ## check we didn't get nothing
-        if not rec["rank"]:
-            return None
-
-        if inputTaxid == 1:
-            return None
+        inputTaxid = self._norm(inputTaxid)
 
-        ## recursively get the parent until we find the genus
-        ## or end up with nothing
-        return self.get_genus_taxid(rec["parent_taxid"])
+        return self._get_taxid_at_rank(inputTaxid, "genus")
 
-    @functools.cache  # noqa: B019
-    def get_species_taxid(self, inputTaxid: int | str) -> int | str | None:
+    def get_species_taxid(self, inputTaxid: int | str) -> int | None:
         """
         Kinda naff function that only works if your inputTaxid is
         at or below species level - for example, if you have a strain
@@ -244,9 +1012,6 @@ class TaxaPlease:
         Takes in an NCBI taxid, traverses up the tree until we find
         something labelled species, or hit a brick wall.
 
-        Yes this could be refactored because it shares a lot of code
-        with the genus function. Let me prove it works first.
-
         Parameters
         ----------
         inputTaxid: int or str
@@ -257,25 +1022,9 @@ class TaxaPlease:
         Optional[int]
             NCBI taxid corresponding to the species
         """
-        ## check we aren't already a species
-        rec = self.get_record(inputTaxid)
-
-        if not rec:
-            return None
+        inputTaxid = self._norm(inputTaxid)
 
-        if rec["rank"] == "species":
-            return inputTaxid
-
-        ## check we didn't get nothing
-        if not rec["rank"]:
-            return None
-
-        if inputTaxid == 1:
-            return None
-
-        ## recursively get the parent until we find the species
-        ## or end up with nothing
-        return self.get_species_taxid(rec["parent_taxid"])
+        return self._get_taxid_at_rank(inputTaxid, "species")
 
     def get_superkingdom_taxid(self, inputTaxid: int | str) -> int | None:
         """
@@ -292,22 +1041,9 @@ class TaxaPlease:
         Optional[int]
             NCBI taxid corresponding to the superkingdom
         """
-        ## check we aren't already a superkingdom
-        rec = self.get_record(inputTaxid)
-
-        if rec["rank"] == "superkingdom":
-            return inputTaxid
+        inputTaxid = self._norm(inputTaxid)
 
-        ## check we didn't get nothing
-        if not rec["rank"]:
-            return None
-
-        if inputTaxid == 1:
-            return None
-
-        ## recursively get the parent until we find the superkingdom
-        ## or end up with nothing
-        return self.get_superkingdom_taxid(rec["parent_taxid"])
+        return self._get_taxid_at_rank(inputTaxid, "superkingdom")
 
     def get_all_parent_taxids(self, inputTaxid: int | str, *, includeSelf: bool = False) -> tuple:
         """
@@ -328,26 +1064,47 @@ class TaxaPlease:
         tuple:
             tuple of parent taxids, from most to least specific
         """
-        return_list = []
+        inputTaxid = self._norm(inputTaxid)
+
+        lineage = tuple(self._get_lineage(inputTaxid))
 
+        ## the first taxid is always the input taxid itself
         if includeSelf:
-            return_list.append(inputTaxid)
+            return lineage
+        else:
+            return lineage[1:]
 
-        tempTaxa = inputTaxid
+    def get_ancestor_set(self, inputTaxid: int | str, *, includeSelf: bool = True) -> frozenset:
+        """
+        Takes in an NCBI taxid, gets all of its parent taxids as a set,
+        for when only membership matters rather than the order.
 
-        while tempTaxa != 1:
-            tempTaxa = self.get_parent_taxid(tempTaxa)
+        Includes the input taxid itself by default.
 
-            if not tempTaxa:
-                break
+        Parameters
+        ----------
+        inputTaxid: int or str
+            NCBI taxid
+        includeSelf: bool (default: True)
+            Include the input taxid in the result
 
-            return_list.append(tempTaxa)
+        Returns
+        -------
+        frozenset:
+            frozenset of parent taxids
+        """
+        inputTaxid = self._norm(inputTaxid)
 
-        return tuple(return_list)
+        lineage = self._get_lineage(inputTaxid)
+
+        if includeSelf:
+            return frozenset(lineage)
+        else:
+            return frozenset(lineage[1:])
 
     def get_common_parent_taxid(
         self, inputTaxidLeft: int | str, inputTaxidRight: int | str
-    ) -> int | str | None:
+    ) -> int | None:
         """
         Takes two NCBI taxids as input, traverses up the taxonomic
         tree to find the first parent taxid that both share.
@@ -364,19 +1121,18 @@ class TaxaPlease:
         Optional[int]:
             Taxid of shared parent, or None
         """
-        left_parents = set(self.get_all_parent_taxids(inputTaxidLeft, includeSelf=True))
+        inputTaxidLeft = self._norm(inputTaxidLeft)
+        inputTaxidRight = self._norm(inputTaxidRight)
 
-        if (inputTaxidLeft != 1) and (len(left_parents) <= 1):
+        if (inputTaxidLeft != 1) and (self._taxid_index(inputTaxidLeft) is None):
             return None
 
-        tempRightId = inputTaxidRight
-
-        while tempRightId not in left_parents:
-            tempRightId = self.get_parent_taxid(tempRightId)
-            if not tempRightId:
-                return None
+        result = self._get_lowest_common_parent(inputTaxidLeft, inputTaxidRight)
 
-        return tempRightId
+        if result:
+            return result[0]
+        else:
+            return None
 
     def get_common_parent_record(
         self, inputTaxidLeft: int | str, inputTaxidRight: int | str
@@ -427,29 +1183,18 @@ class TaxaPlease:
             - right_levels_to_common_parent
             - total_levels_between_taxa
         """
-        ## do it one way
-        left_parents = set(self.get_all_parent_taxids(inputTaxidLeft, includeSelf=True))
-
-        tempRightId = inputTaxidRight
-        left_levels = 0
-
-        while tempRightId not in left_parents:
-            tempRightId = self.get_parent_taxid(tempRightId)
-            left_levels += 1
-            if not tempRightId:
-                return None
+        inputTaxidLeft = self._norm(inputTaxidLeft)
+        inputTaxidRight = self._norm(inputTaxidRight)
 
-        ## do it the other way
-        right_parents = set(self.get_all_parent_taxids(inputTaxidRight, includeSelf=True))
+        result = self._get_lowest_common_parent(inputTaxidLeft, inputTaxidRight)
 
-        tempLeftId = inputTaxidLeft
-        right_levels = 0
+        ## no common parent, e.g. one of the taxids isn't in the database
+        if result is None:
+            return None
 
-        while tempLeftId not in right_parents:
-            tempLeftId = self.get_parent_taxid(tempLeftId)
-            right_levels += 1
-            if not tempLeftId:
-                return None
+        ## the left count is the levels climbed from the right taxid,
+        ## and vice versa
+        _, right_levels, left_levels = result
 
         result_dict = {
             "left_levels_to_common_parent": left_levels,
@@ -459,6 +1204,54 @@ class TaxaPlease:
 
         return result_dict
 
+    def _is_in_kingdom(self, inputTaxid: int | str, kingdomTaxid: int) -> bool:
+        """
+        Checks whether the input taxid sits under the given kingdom,
+        which is worked out when the database is generated.
+
+        Parameters
+        ----------
+        inputTaxid: int or str
+            NCBI taxid
+        kingdomTaxid: int
+            Taxid of one of the kingdoms in taxaplease_data.KINGDOMS
+
+        Returns
+        -------
+        bool:
+            True it is or False it isn't, including when the input
+            taxid is missing
+        """
+        taxid = self._taxid_index(inputTaxid)
+
+        if taxid is None:
+            return False
+
+        return bool(self._kingdom.item(taxid) & _KINGDOM_BITS[kingdomTaxid])
+
+    def _is_in_kingdom_many(self, inputTaxids, kingdomTaxid: int) -> np.ndarray:
+        """
+        Same check as _is_in_kingdom, for any number of taxids at once
+
+        Parameters
+        ----------
+        inputTaxids: array-like of int or str
+            NCBI taxids
+        kingdomTaxid: int
+            Taxid of one of the kingdoms in taxaplease_data.KINGDOMS
+
+        Returns
+        -------
+        np.ndarray:
+            bool array, True for each taxid under the kingdom
+        """
+        taxids, found = self._taxid_indices(inputTaxids)
+
+        result = np.zeros(len(taxids), dtype=bool)
+        result[found] = (self._kingdom[taxids[found]] & _KINGDOM_BITS[kingdomTaxid]) != 0
+
+        return result
+
     def isArchaea(self, inputTaxid: int | str) -> bool:
         """
         Is the input taxid in the Archaea superkingdom?
@@ -473,8 +1266,10 @@ class TaxaPlease:
         bool:
             True it is or False it isn't
         """
+        inputTaxid = self._norm(inputTaxid)
+
         targetTaxid = 2157
-        return targetTaxid in self.get_all_parent_taxids(inputTaxid, includeSelf=True)
+        return self._is_in_kingdom(inputTaxid, targetTaxid)
 
     def isBacteria(self, inputTaxid: int | str) -> bool:
         """
@@ -490,8 +1285,10 @@ class TaxaPlease:
         bool:
             True it is or False it isn't
         """
+        inputTaxid = self._norm(inputTaxid)
+
         targetTaxid = 2
-        return targetTaxid in self.get_all_parent_taxids(inputTaxid, includeSelf=True)
+        return self._is_in_kingdom(inputTaxid, targetTaxid)
 
     def isEukaryote(self, inputTaxid: int | str) -> bool:
         """
@@ -507,8 +1304,10 @@ class TaxaPlease:
         bool:
             True it is or False it isn't
         """
+        inputTaxid = self._norm(inputTaxid)
+
         targetTaxid = 2759
-        return targetTaxid in self.get_all_parent_taxids(inputTaxid, includeSelf=True)
+        return self._is_in_kingdom(inputTaxid, targetTaxid)
 
     def isVirus(self, inputTaxid: int | str) -> bool:
         """
@@ -524,56 +1323,82 @@ class TaxaPlease:
         bool:
             True it is or False it isn't
         """
-        targetTaxid = 10239
+        inputTaxid = self._norm(inputTaxid)
 
-        ## check the parents
-        return targetTaxid in self.get_all_parent_taxids(inputTaxid, includeSelf=True)
+        targetTaxid = 10239
+        return self._is_in_kingdom(inputTaxid, targetTaxid)
 
-    def isPhage(self, inputTaxid: int | str) -> bool:
+    def isArchaea_many(self, inputTaxids) -> np.ndarray:
         """
-        Is the input taxid a phage?
+        Are the input taxids in the Archaea superkingdom?
+        Checks them all in one go rather than one by one.
 
         Parameters
         ----------
-        inputTaxidLeft: int or str
-            NCBI taxid
+        inputTaxids: array-like of int or str
+            NCBI taxids
 
         Returns
         -------
-        bool:
-            True it is or False it isn't
+        np.ndarray:
+            bool array, True for each taxid that is
         """
-        ## check the parents
-        parents = set(self.get_all_parent_taxids(inputTaxid, includeSelf=True))
-        ## get all the phage taxids
-        phages = set(self.phages.keys())
-        ## check if the sets have any items in common
-        intersection = phages.intersection(parents)
+        return self._is_in_kingdom_many(inputTaxids, 2157)
 
-        return bool(len(intersection))
+    def isBacteria_many(self, inputTaxids) -> np.ndarray:
+        """
+        Are the input taxids in the Bacteria superkingdom?
+        Checks them all in one go rather than one by one.
 
-    def __checkIfTaxidDeleted(self, inputTaxid: int | str) -> bool:
+        Parameters
+        ----------
+        inputTaxids: array-like of int or str
+            NCBI taxids
+
+        Returns
+        -------
+        np.ndarray:
+            bool array, True for each taxid that is
+        """
+        return self._is_in_kingdom_many(inputTaxids, 2)
+
+    def isEukaryote_many(self, inputTaxids) -> np.ndarray:
         """
-        Check if a taxid is in the deleted_taxa table
+        Are the input taxids in the Eukaryota superkingdom?
+        Checks them all in one go rather than one by one.
 
         Parameters
         ----------
-        inputTaxidLeft: int or str
-            NCBI taxid
+        inputTaxids: array-like of int or str
+            NCBI taxids
 
         Returns
         -------
-        bool:
-            True if in the deleted table, else False
+        np.ndarray:
+            bool array, True for each taxid that is
         """
-        cur = self.con.cursor()
-        res = cur.execute("SELECT * FROM deleted_taxa WHERE taxid = ?", [inputTaxid]).fetchone()
+        return self._is_in_kingdom_many(inputTaxids, 2759)
 
-        return bool(res)
+    def isVirus_many(self, inputTaxids) -> np.ndarray:
+        """
+        Are the input taxids in the Viruses superkingdom?
+        Checks them all in one go rather than one by one.
 
-    def __checkIfTaxidMerged(self, inputTaxid: int | str) -> bool:
+        Parameters
+        ----------
+        inputTaxids: array-like of int or str
+            NCBI taxids
+
+        Returns
+        -------
+        np.ndarray:
+            bool array, True for each taxid that is
         """
-        Check if a taxid is in the merged table
+        return self._is_in_kingdom_many(inputTaxids, 10239)
+
+    def isPhage(self, inputTaxid: int | str) -> bool:
+        """
+        Is the input taxid a phage?
 
         Parameters
         ----------
@@ -583,17 +1408,12 @@ class TaxaPlease:
         Returns
         -------
         bool:
-            If in the table, return the new taxid, else return False
+            True it is or False it isn't
         """
-        cur = self.con.cursor()
-        res = cur.execute(
-            "SELECT new_taxid FROM merged_taxa WHERE old_taxid = ?", [inputTaxid]
-        ).fetchone()
+        inputTaxid = self._norm(inputTaxid)
 
-        if res:
-            return res[0]
-        else:
-            return False
+        ## check if any of the parents are phage taxids
+        return not self._phage_set.isdisjoint(self._get_lineage(inputTaxid))
 
     def checkTaxidStatus(self, inputTaxid: int | str) -> dict:
         """
@@ -609,11 +1429,23 @@ class TaxaPlease:
         dict:
             dictionary with status of id
         """
+        inputTaxid = self._norm(inputTaxid)
+
+        ## -1 if it's been deleted, the new taxid if it's been merged
+        status = []
+
+        if self._is_taxid(inputTaxid):
+            start, end = np.searchsorted(self._status_taxid, [inputTaxid, inputTaxid + 1])
+            status = self._status[start:end].tolist()
+
+        merged = [taxid for taxid in status if taxid != -1]
+
         return_dict = {}
 
-        return_dict["isCurrent"] = bool(self.get_record(inputTaxid))
-        return_dict["isDeleted"] = self.__checkIfTaxidDeleted(inputTaxid)
-        return_dict["isMerged"] = self.__checkIfTaxidMerged(inputTaxid)
+        return_dict["isCurrent"] = self._taxid_index(inputTaxid) is not None
+        return_dict["isDeleted"] = -1 in status
+        ## the new taxid if it's been merged, else False
+        return_dict["isMerged"] = merged[0] if merged else False
 
         return return_dict
 
@@ -633,23 +1465,66 @@ class TaxaPlease:
         """
         assert len(args)
 
+        args = [self._norm(inputTaxid) for inputTaxid in args]
+
         ## instantiate a directed graph object
         graph = nx.DiGraph()
 
+        ## taxids whose parents are already in the graph
+        seen = set()
+
+        ## (parent taxid, taxid) edges from each walk
+        walks = []
+
         for inputTaxid in args:
-            ## get all the parents of taxid1, include self, reverse list
-            parents = [
-                self.get_record(inputTaxid),
-                *[self.get_record(x) for x in self.get_all_parent_taxids(inputTaxid)],
-            ][::-1]
-            ## add edges to graph
-            for rec, next_rec in zip(parents, parents[1:], strict=False):
-                graph.add_node(rec["name"])
-                graph.add_edge(rec["name"], next_rec["name"])
+            ## walk up from the taxid until we reach the root, or a
+            ## taxid an earlier walk already went through - everything
+            ## above that is in the graph already
+            edges = []
+            taxid = inputTaxid
+
+            while taxid != 1 and taxid not in seen:
+                seen.add(taxid)
+                taxid_index = self._taxid_index(taxid)
+
+                if taxid_index is None:
+                    break
+
+                parent_taxid = self._parent.item(taxid_index)
+                edges.append((parent_taxid, taxid))
+                taxid = parent_taxid
+
+            walks.append(edges)
+
+        ## then look up the names for every walk at once
+        names = self._get_names({taxid for edges in walks for edge in edges for taxid in edge})
+
+        for edges in walks:
+            ## add edges to graph, from the top down
+            for parent_taxid, taxid in reversed(edges):
+                graph.add_node(names[parent_taxid])
+                graph.add_edge(names[parent_taxid], names[taxid])
 
         ## return graph object
         return graph
 
+    def _get_names(self, taxids: set) -> dict:
+        """
+        Gets the names of a set of taxids in as few queries as
+        possible, leaving out any that aren't in the database
+        """
+        taxids = list(taxids)
+        names = {}
+
+        for start in range(0, len(taxids), _NAMES_BATCH_SIZE):
+            batch = taxids[start : start + _NAMES_BATCH_SIZE]
+            sql = _NAMES_SQL.format(placeholders=", ".join("?" * len(batch)))
+
+            for taxid, name in self._fetchall(self._cur_names, sql, batch):
+                names[taxid] = name
+
+        return names
+
     def print_taxonomy_graph(self, *args) -> str:
         """
         Takes in taxids as arguments, gets all the parents,
@@ -704,13 +1579,14 @@ class TaxaPlease:
             Baltimore classification as a string (for example, -ssRNA)
             or None
         """
-        if not self.isVirus(inputTaxid):
+        inputTaxid = self._norm(inputTaxid)
+
+        if not self._is_in_kingdom(inputTaxid, 10239):
             return None
 
-        parents = set(self.get_all_parent_taxids(inputTaxid, includeSelf=True))
-        baltimore_keys = set(self.baltimore)
+        parents = frozenset(self._get_lineage(inputTaxid))
 
-        intersection = parents.intersection(baltimore_keys)
+        intersection = self._baltimore_set.intersection(parents)
 
         if len(intersection):
             ## get the key, and use that to get the value
@@ -1,3 +1,12 @@
+## Taxids of the top level groups that every taxon is sorted into
+## when the database is generated
+KINGDOMS = {
+    2: "Bacteria",
+    2157: "Archaea",
+    2759: "Eukaryota",
+    10239: "Viruses",
+}
+
 ## Description of what each viral realm corresponds to
 VIRAL_REALMS = {
     2840022: {
@@ -0,0 +1,7 @@
+## kept in its own module so that the CLI can report the version
+## without importing taxaplease and everything it depends on
+__version__ = "1.1.0"
+
+## bumped whenever database generation changes the tables, so that
+## databases built by an older version get rebuilt
+SCHEMA_VERSION = 4
@@ -0,0 +1,49 @@
+import pytest  # type: ignore
+
+## taxaplease is imported where it's used rather than up here, so that
+## collecting the tests (or running ones that don't need the database)
+## doesn't load it and its dependencies
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--runperf",
+        action="store_true",
+        default=False,
+        help="Also run the timing tests marked perf (needs pytest-benchmark)",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    ## timings depend on the machine, so they're only checked when asked
+    if config.getoption("--runperf"):
+        return
+
+    skip_perf = pytest.mark.skip(reason="needs --runperf")
+
+    for item in items:
+        if "perf" in item.keywords:
+            item.add_marker(skip_perf)
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "perf: timing tests, only run with --runperf")
+
+    ## under pytest-xdist, build the database and its arrays once in the
+    ## controller, so that the workers only have to open them
+    if hasattr(config, "workerinput"):
+        return
+
+    if config.pluginmanager.hasplugin("xdist") and config.getoption("numprocesses", None):
+        from taxaplease import TaxaPlease  # type: ignore
+
+        TaxaPlease()
+
+
+@pytest.fixture(scope="session")
+def taxa():
+    from taxaplease import TaxaPlease  # type: ignore
+
+    ## opening the database (and building it, the first time) is the
+    ## slow part, and none of the tests change it, so share one instance
+    return TaxaPlease()
@@ -1,35 +1,41 @@
 import json
 import subprocess
 
-import pytest  # type: ignore
+import cli  # type: ignore
 
 
-@pytest.fixture(scope="module")
-def instantiate_db():
-    subprocess.run(
-        ["taxaplease", "taxid", "--parent", "1"],
-        capture_output=True,
-    )
+def run_taxaplease(capsys, *argv):
+    """
+    Runs the CLI in this process rather than a new one for every
+    test, and returns its JSON output
+    """
+    cli.main(list(argv))
 
-    return 0
+    return json.loads(capsys.readouterr().out)
 
 
-def test_root_returns_itself_as_parent(instantiate_db):
+def test_cli_smoke(taxa):
+    ## the one test that goes through the installed entry point - the
+    ## taxa fixture has built the database by now, so it's only opened
     result = subprocess.run(
         ["taxaplease", "taxid", "--parent", "1"],
         capture_output=True,
     )
 
+    assert result.returncode == 0
     assert result.stdout.strip() == b"1"
 
 
-def test_root_record_as_expected(instantiate_db):
-    result = subprocess.run(
-        ["taxaplease", "record", "--record", "1"],
-        capture_output=True,
-    )
+def test_root_returns_itself_as_parent(taxa, capsys):
+    result = run_taxaplease(capsys, "taxid", "--parent", "1")
 
-    assert json.loads(result.stdout.decode("utf-8")) == {
+    assert result == 1
+
+
+def test_root_record_as_expected(taxa, capsys):
+    result = run_taxaplease(capsys, "record", "--record", "1")
+
+    assert result == {
         "taxid": 1,
         "name": "root",
         "rank": "no rank",
@@ -37,197 +43,143 @@ def test_root_record_as_expected(instantiate_db):
     }
 
 
-def test_taxid_2000_is_streptosporangium(instantiate_db):
-    result = subprocess.run(
-        ["taxaplease", "record", "--record", "2000"],
-        capture_output=True,
-    )
+def test_taxid_2000_is_streptosporangium(taxa, capsys):
+    result = run_taxaplease(capsys, "record", "--record", "2000")
 
-    assert json.loads(result.stdout.decode("utf-8")).get("name") == "Streptosporangium"
+    assert result.get("name") == "Streptosporangium"
 
 
-def test_parent_taxa(instantiate_db):
-    result = subprocess.run(
-        ["taxaplease", "taxid", "--parent", "2004"],
-        capture_output=True,
-    )
+def test_parent_taxa(taxa, capsys):
+    result = run_taxaplease(capsys, "taxid", "--parent", "2004")
 
-    assert json.loads(result.stdout.decode("utf-8")) == 85012
+    assert result == 85012
 
 
-def test_get_genus_taxid(instantiate_db):
-    result = subprocess.run(
-        ["taxaplease", "taxid", "--genus", "562"],
-        capture_output=True,
-    )
+def test_get_genus_taxid(taxa, capsys):
+    result = run_taxaplease(capsys, "taxid", "--genus", "562")
 
-    assert json.loads(result.stdout.decode("utf-8")) == 561
+    assert result == 561
 
 
-def test_common_parent_record_distant_taxa(instantiate_db):
+def test_common_parent_record_distant_taxa(taxa, capsys):
     taxid_canis_lupus = 9612
     taxid_aloe_vera = 34199
 
-    result = subprocess.run(
-        [
-            "taxaplease",
-            "record",
-            "--common",
-            str(taxid_canis_lupus),
-            str(taxid_aloe_vera),
-        ],
-        capture_output=True,
+    result = run_taxaplease(
+        capsys, "record", "--common", str(taxid_canis_lupus), str(taxid_aloe_vera)
     )
 
-    assert json.loads(result.stdout.decode("utf-8")).get("name") == "Eukaryota"
+    assert result.get("name") == "Eukaryota"
 
 
-def test_common_parent_record_close_taxa(instantiate_db):
+def test_common_parent_record_close_taxa(taxa, capsys):
     ## E. coli and a random Shigella are both Enterobacteriaceae
     taxid_e_coli = 562
     taxid_s_flexneri = 623
 
-    result = subprocess.run(
-        ["taxaplease", "record", "--common", str(taxid_e_coli), str(taxid_s_flexneri)],
-        capture_output=True,
-    )
+    result = run_taxaplease(capsys, "record", "--common", str(taxid_e_coli), str(taxid_s_flexneri))
 
-    assert json.loads(result.stdout.decode("utf-8")).get("name") == "Enterobacteriaceae"
+    assert result.get("name") == "Enterobacteriaceae"
 
 
-def test_levels_between_close_taxa(instantiate_db):
+def test_levels_between_close_taxa(taxa, capsys):
     ## levels between close taxa
     taxid_e_coli = 562
     taxid_s_flexneri = 623
 
-    result = subprocess.run(
-        [
-            "taxaplease",
-            "check",
-            "--levels-between",
-            str(taxid_e_coli),
-            str(taxid_s_flexneri),
-        ],
-        capture_output=True,
+    result = run_taxaplease(
+        capsys, "check", "--levels-between", str(taxid_e_coli), str(taxid_s_flexneri)
     )
 
-    assert json.loads(result.stdout.decode("utf-8")) == {
+    assert result == {
         "left_levels_to_common_parent": 2,
         "right_levels_to_common_parent": 2,
         "total_levels_between_taxa": 4,
     }
 
 
-def test_levels_between_distant_taxa(instantiate_db):
+def test_levels_between_distant_taxa(taxa, capsys):
     ## levels between distant taxa
     taxid_e_coli = 562
     taxid_canis_lupus = 9612
 
-    result = subprocess.run(
-        [
-            "taxaplease",
-            "check",
-            "--levels-between",
-            str(taxid_e_coli),
-            str(taxid_canis_lupus),
-        ],
-        capture_output=True,
+    result = run_taxaplease(
+        capsys, "check", "--levels-between", str(taxid_e_coli), str(taxid_canis_lupus)
     )
 
-    assert json.loads(result.stdout.decode("utf-8")) == {
+    assert result == {
         "left_levels_to_common_parent": 26,
         "right_levels_to_common_parent": 8,
         "total_levels_between_taxa": 34,
     }
 
 
-def test_is_virus_fail(instantiate_db):
+def test_is_virus_fail(taxa, capsys):
     ## is aloe vera a virus? (no)
     taxid_aloe_vera = 34199
 
-    result = subprocess.run(
-        ["taxaplease", "check", "--is-virus", str(taxid_aloe_vera)],
-        capture_output=True,
-    )
+    result = run_taxaplease(capsys, "check", "--is-virus", str(taxid_aloe_vera))
 
-    assert not json.loads(result.stdout.decode("utf-8"))
+    assert not result
 
 
-def test_is_eukaryote_pass(instantiate_db):
+def test_is_eukaryote_pass(taxa, capsys):
     taxid_aloe_vera = 34199
 
-    result = subprocess.run(
-        ["taxaplease", "check", "--is-eukaryote", str(taxid_aloe_vera)],
-        capture_output=True,
-    )
+    result = run_taxaplease(capsys, "check", "--is-eukaryote", str(taxid_aloe_vera))
 
-    assert json.loads(result.stdout.decode("utf-8"))
+    assert result
 
 
-def test_is_archaea_fail(instantiate_db):
+def test_is_archaea_fail(taxa, capsys):
     ## Shigella is not Archaea
     taxid_s_flexneri = 623
 
-    result = subprocess.run(
-        ["taxaplease", "check", "--is-archaea", str(taxid_s_flexneri)],
-        capture_output=True,
-    )
+    result = run_taxaplease(capsys, "check", "--is-archaea", str(taxid_s_flexneri))
 
-    assert not json.loads(result.stdout.decode("utf-8"))
+    assert not result
 
 
-def test_is_archaea_pass(instantiate_db):
+def test_is_archaea_pass(taxa, capsys):
     ## Methanobrevibacter smithii is Archaea
     taxid_random_archaea = 2173
 
-    result = subprocess.run(
-        ["taxaplease", "check", "--is-archaea", str(taxid_random_archaea)],
-        capture_output=True,
-    )
+    result = run_taxaplease(capsys, "check", "--is-archaea", str(taxid_random_archaea))
 
-    assert json.loads(result.stdout.decode("utf-8"))
+    assert result
 
 
-def test_current_taxid(instantiate_db):
+def test_current_taxid(taxa, capsys):
     taxid_bacteria = 2
 
-    result = subprocess.run(
-        ["taxaplease", "check", "--status", str(taxid_bacteria)],
-        capture_output=True,
-    )
+    result = run_taxaplease(capsys, "check", "--status", str(taxid_bacteria))
 
-    assert json.loads(result.stdout.decode("utf-8")) == {
+    assert result == {
         "isCurrent": True,
         "isDeleted": False,
         "isMerged": False,
     }
 
 
-def test_deleted_taxid(instantiate_db):
+def test_deleted_taxid(taxa, capsys):
     deletedTaxid = 3467805
 
-    result = subprocess.run(
-        ["taxaplease", "check", "--status", str(deletedTaxid)],
-        capture_output=True,
-    )
+    result = run_taxaplease(capsys, "check", "--status", str(deletedTaxid))
 
-    assert json.loads(result.stdout.decode("utf-8")) == {
+    assert result == {
         "isCurrent": False,
         "isDeleted": True,
         "isMerged": False,
     }
 
 
-def test_merged_taxid(instantiate_db):
+def test_merged_taxid(taxa, capsys):
     photobacteriumProfundumOld = 12
     photobacteriumProfundumNew = 74109
 
-    result = subprocess.run(
-        ["taxaplease", "check", "--status", str(photobacteriumProfundumOld)],
-        capture_output=True,
-    )
+    result = run_taxaplease(capsys, "check", "--status", str(photobacteriumProfundumOld))
 
-    assert json.loads(result.stdout.decode("utf-8")) == {
+    assert result == {
         "isCurrent": False,
         "isDeleted": False,
         "isMerged": photobacteriumProfundumNew,
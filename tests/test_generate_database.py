@@ -0,0 +1,137 @@
+import sqlite3
+
+import database_generation.generate_database as gd  # type: ignore
+import pandas as pd  # type: ignore
+import pytest  # type: ignore
+
+## a few lines in the taxdump format, with ranks out of sorted order and
+## empty fields, which is where the pyarrow and pandas readers can differ
+NODES_DMP = (
+    "1\t|\t1\t|\tno rank\t|\tx\t|\n"
+    "2\t|\t131567\t|\tsuperkingdom\t|\tx\t|\n"
+    "561\t|\t543\t|\tgenus\t|\tx\t|\n"
+    "562\t|\t561\t|\tspecies\t|\tx\t|\n"
+    "9999\t|\t1\t|\t\t|\tx\t|\n"
+)
+
+LINEAGES_DMP = "1\t|\troot\t|\t\t|\n2\t|\tBacteria\t|\tcellular organisms; \t|\n3\t|\t\t|\t\t|\n"
+
+
+@pytest.mark.parametrize(
+    ("contents", "columns"),
+    [
+        (NODES_DMP, {"taxid": "int32", "parent_taxid": "int32", "rank": "category"}),
+        (LINEAGES_DMP, {"taxid": "int32", "name": "str"}),
+        (NODES_DMP, {"taxid": "int32"}),
+    ],
+    ids=["nodes", "lineages", "single_column"],
+)
+def test_read_dmp_pyarrow_matches_pandas(tmp_path, monkeypatch, contents, columns):
+    pytest.importorskip("pyarrow")
+
+    path = tmp_path / "test.dmp"
+    path.write_text(contents)
+
+    with_pyarrow = gd.read_dmp(path, columns)
+
+    monkeypatch.setattr(gd, "pa", None)
+    with_pandas = gd.read_dmp(path, columns)
+
+    assert with_pyarrow.equals(with_pandas)
+    assert with_pyarrow.index.dtype == with_pandas.index.dtype
+    ## stricter than equals - dtypes and category order have to match too
+    pd.testing.assert_frame_equal(with_pyarrow, with_pandas, check_column_type=False)
+
+
+## taxid: parent taxid - the root is its own parent, 12345 is an orphan
+## whose parent isn't in the table, and 28384 sits outside the kingdoms
+PARENTS = {
+    1: 1,
+    131567: 1,
+    2: 131567,
+    561: 2,
+    562: 561,
+    2157: 131567,
+    2759: 131567,
+    10239: 1,
+    10240: 10239,
+    28384: 1,
+    12345: 99999,
+}
+
+
+def walk_up(taxid):
+    """Every taxid at or above taxid, the slow way"""
+    lineage = {taxid}
+
+    while PARENTS.get(taxid, taxid) != taxid:
+        taxid = PARENTS[taxid]
+        if taxid not in PARENTS:
+            break
+        lineage.add(taxid)
+
+    return lineage
+
+
+def numbered_nodes():
+    nodes = pd.DataFrame(
+        {"parent_taxid": list(PARENTS.values()), "rank": "no rank"},
+        index=pd.Index(list(PARENTS), name="taxid"),
+    )
+    nodes["depth"], nodes["lft"], nodes["rgt"] = gd.nested_set_numbering(
+        nodes.index.tolist(), nodes["parent_taxid"].tolist()
+    )
+
+    return nodes
+
+
+def test_nested_set_numbering():
+    nodes = numbered_nodes()
+
+    assert nodes["depth"].to_dict() == {taxid: len(walk_up(taxid)) - 1 for taxid in PARENTS}
+    assert nodes.loc[1, "depth"] == 0
+    assert nodes.loc[562, "depth"] == 4
+    ## numbered as a root of its own rather than dropped
+    assert nodes.loc[12345, "depth"] == 0
+
+    ## every node's range covers itself, and a leaf's covers nothing else
+    assert (nodes["lft"] <= nodes["rgt"]).all()
+    assert nodes.loc[562, "lft"] == nodes.loc[562, "rgt"]
+    assert nodes["lft"].is_unique
+
+    for taxid in PARENTS:
+        for other in PARENTS:
+            below = nodes.loc[other, "lft"] <= nodes.loc[taxid, "lft"] <= nodes.loc[other, "rgt"]
+            assert below == (other in walk_up(taxid)), (taxid, other)
+
+
+def test_write_database_kingdom_taxid(tmp_path):
+    nodes = numbered_nodes()
+    lineages = pd.DataFrame(
+        {"name": [f"taxon {taxid}" for taxid in PARENTS]},
+        index=pd.Index(list(PARENTS), name="taxid"),
+    )
+    deleted = pd.DataFrame(index=pd.Index([3], name="taxid"))
+    merged = pd.DataFrame({"new_taxid": [562]}, index=pd.Index([4], name="old_taxid"))
+
+    db_path = tmp_path / "taxa.db"
+    gd.write_database(db_path, nodes, lineages, deleted, merged, {"build_id": "test"})
+
+    with sqlite3.connect(db_path) as conn:
+        kingdoms = dict(conn.execute("SELECT taxid, kingdom_taxid FROM taxa"))
+        assert conn.execute("SELECT name FROM taxa WHERE taxid = 562").fetchone() == ("taxon 562",)
+    conn.close()
+
+    assert kingdoms == {
+        1: None,
+        131567: None,
+        2: 2,
+        561: 2,
+        562: 2,
+        2157: 2157,
+        2759: 2759,
+        10239: 10239,
+        10240: 10239,
+        28384: None,
+        12345: None,
+    }
@@ -0,0 +1,32 @@
+import pytest  # type: ignore
+
+## timing checks for the lookups that have been optimised, run with
+## pytest --runperf. The limits are loose enough for a slow machine -
+## they're there to catch a return to walking the tree a query at a
+## time, not to measure small changes.
+
+pytestmark = pytest.mark.perf
+
+
+def test_common_parent_record_perf(benchmark, taxa):
+    ## E. coli and the grey wolf are 34 levels apart. The caches are
+    ## cleared before each round, so every round climbs the tree.
+    taxid_e_coli = 562
+    taxid_canis_lupus = 9612
+
+    result = benchmark.pedantic(
+        taxa.get_common_parent_record,
+        args=(taxid_e_coli, taxid_canis_lupus),
+        setup=taxa._init_caches,
+        rounds=200,
+    )
+
+    assert result is not None
+    assert benchmark.stats.stats.median < 200e-6
+
+
+def test_is_archaea_perf(benchmark, taxa):
+    taxid_random_archaea = 2173
+
+    assert benchmark(taxa.isArchaea, taxid_random_archaea)
+    assert benchmark.stats.stats.median < 20e-6
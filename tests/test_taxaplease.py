@@ -1,176 +1,279 @@
-import subprocess
+import pickle
 
+import numpy as np  # type: ignore
 import pytest  # type: ignore
 
-from taxaplease import TaxaPlease  # type: ignore
 
+@pytest.mark.parametrize(
+    ("method", "taxid", "field", "expected"),
+    [
+        ("get_parent_taxid", 1, None, 1),
+        (
+            "get_record",
+            1,
+            None,
+            {"taxid": 1, "name": "root", "rank": "no rank", "parent_taxid": 1},
+        ),
+        ("get_record", 2000, "name", "Streptosporangium"),
+        ("get_parent_taxid", 2004, None, 85012),
+        ("get_genus_taxid", 562, None, 561),
+    ],
+    ids=[
+        "root_returns_itself_as_parent",
+        "root_record_as_expected",
+        "taxid_2000_is_streptosporangium",
+        "parent_taxa",
+        "get_genus_taxid",
+    ],
+)
+def test_lookup(taxa, method, taxid, field, expected):
+    ## field picks a single value out of a record
+    result = getattr(taxa, method)(taxid)
+
+    if field:
+        result = result.get(field)
+
+    assert result == expected
+
+
+def test_record_can_be_modified(taxa):
+    ## records are cached, so a caller's changes mustn't leak into them
+    record = taxa.get_record(1)
+    record["name"] = "not root"
+
+    assert taxa.get_record(1)["name"] == "root"
+
+
+def test_ancestor_set(taxa):
+    taxid_e_coli = 562
+    taxid_bacteria = 2
 
-@pytest.fixture(scope="module")
-def instantiate_db():
-    subprocess.run(
-        ["taxaplease", "taxid", "--parent", "1"],
-        capture_output=True,
+    assert taxa.get_ancestor_set(taxid_e_coli) == frozenset(
+        taxa.get_all_parent_taxids(taxid_e_coli, includeSelf=True)
     )
-    return 0
-
-
-def test_root_returns_itself_as_parent(instantiate_db):
-    taxaPlease = TaxaPlease()
-    assert taxaPlease.get_parent_taxid(1) == 1
-
-
-def test_root_record_as_expected(instantiate_db):
-    taxaPlease = TaxaPlease()
-    assert taxaPlease.get_record(1) == {
-        "taxid": 1,
-        "name": "root",
-        "rank": "no rank",
-        "parent_taxid": 1,
-    }
-
-
-def test_taxid_2000_is_streptosporangium(instantiate_db):
-    taxaPlease = TaxaPlease()
-    assert taxaPlease.get_record(2000).get("name") == "Streptosporangium"
-
-
-def test_parent_taxa(instantiate_db):
-    taxaPlease = TaxaPlease()
-    assert taxaPlease.get_parent_taxid(2004) == 85012
-
-
-def test_get_genus_taxid(instantiate_db):
-    taxaPlease = TaxaPlease()
-    assert taxaPlease.get_genus_taxid(562) == 561
-
-
-def test_common_parent_record_distant_taxa(instantiate_db):
-    taxaPlease = TaxaPlease()
+    assert taxid_bacteria in taxa.get_ancestor_set(taxid_e_coli, includeSelf=False)
+    assert taxid_e_coli not in taxa.get_ancestor_set(taxid_e_coli, includeSelf=False)
+
+
+@pytest.mark.parametrize(
+    "taxids",
+    [
+        [1, 2, 562, 623, 2173, 34199, 999999999],
+        ["562", "x", "", " 2157 ", "-2"],
+        [562, "562", 562.0, 562.9, True, None, "x", 2**70],
+    ],
+    ids=["ints", "strings", "mixed"],
+)
+def test_many_match_one_by_one(taxa, taxids):
+    ## the batched lookups give the same answers as the single ones,
+    ## with a parent of 0 for a missing taxid - including for values
+    ## that can't be a taxid at all
+    assert taxa.get_parent_taxid_many(taxids).tolist() == [
+        taxa.get_parent_taxid(taxid) or 0 for taxid in taxids
+    ]
+
+    for method in ("isArchaea", "isBacteria", "isEukaryote", "isVirus"):
+        assert getattr(taxa, f"{method}_many")(taxids).tolist() == [
+            getattr(taxa, method)(taxid) for taxid in taxids
+        ]
+
+
+def test_common_parent_record_distant_taxa(taxa):
     taxid_canis_lupus = 9612
     taxid_aloe_vera = 34199
     assert (
-        taxaPlease.get_common_parent_record(taxid_canis_lupus, taxid_aloe_vera).get("name")
-        == "Eukaryota"
+        taxa.get_common_parent_record(taxid_canis_lupus, taxid_aloe_vera).get("name") == "Eukaryota"
     )
 
 
-def test_common_parent_record_close_taxa(instantiate_db):
-    taxaPlease = TaxaPlease()
+def test_common_parent_record_close_taxa(taxa):
     ## E. coli and a random Shigella are both Enterobacteriaceae
     taxid_e_coli = 562
     taxid_s_flexneri = 623
 
     assert (
-        taxaPlease.get_common_parent_record(taxid_e_coli, taxid_s_flexneri).get("name")
+        taxa.get_common_parent_record(taxid_e_coli, taxid_s_flexneri).get("name")
         == "Enterobacteriaceae"
     )
 
 
-def test_levels_between_close_taxa(instantiate_db):
-    taxaPlease = TaxaPlease()
-
+def test_levels_between_close_taxa(taxa):
     ## levels between close taxa
     taxid_e_coli = 562
     taxid_s_flexneri = 623
 
-    assert taxaPlease.get_number_of_levels_between_taxa(taxid_e_coli, taxid_s_flexneri) == {
+    assert taxa.get_number_of_levels_between_taxa(taxid_e_coli, taxid_s_flexneri) == {
         "left_levels_to_common_parent": 2,
         "right_levels_to_common_parent": 2,
         "total_levels_between_taxa": 4,
     }
 
 
-def test_levels_between_distant_taxa(instantiate_db):
-    taxaPlease = TaxaPlease()
-
+def test_levels_between_distant_taxa(taxa):
     ## levels between distant taxa
     taxid_e_coli = 562
     taxid_canis_lupus = 9612
 
-    assert taxaPlease.get_number_of_levels_between_taxa(taxid_e_coli, taxid_canis_lupus) == {
+    assert taxa.get_number_of_levels_between_taxa(taxid_e_coli, taxid_canis_lupus) == {
         "left_levels_to_common_parent": 26,
         "right_levels_to_common_parent": 8,
         "total_levels_between_taxa": 34,
     }
 
 
-def test_is_virus_fail(instantiate_db):
-    taxaPlease = TaxaPlease()
-
-    ## is aloe vera a virus? (no)
-    taxid_aloe_vera = 34199
-
-    assert not taxaPlease.isVirus(taxid_aloe_vera)
-
-
-def test_is_eukaryote_pass(instantiate_db):
-    taxaPlease = TaxaPlease()
-
-    taxid_aloe_vera = 34199
-
-    assert taxaPlease.isEukaryote(taxid_aloe_vera)
-
-
-def test_is_archaea_fail(instantiate_db):
-    taxaPlease = TaxaPlease()
+def test_levels_between_distant_taxa_swapped(taxa):
+    ## swapping the taxa swaps the level counts
+    taxid_e_coli = 562
+    taxid_canis_lupus = 9612
 
-    ## Shigella is not Archaea
-    taxid_s_flexneri = 623
+    assert taxa.get_number_of_levels_between_taxa(taxid_canis_lupus, taxid_e_coli) == {
+        "left_levels_to_common_parent": 8,
+        "right_levels_to_common_parent": 26,
+        "total_levels_between_taxa": 34,
+    }
 
-    assert not taxaPlease.isArchaea(taxid_s_flexneri)
 
+def test_levels_between_taxon_and_its_parent(taxa):
+    ## Escherichia is E. coli's own genus, so it's the common parent
+    taxid_e_coli = 562
+    taxid_escherichia = 561
 
-def test_is_archaea_pass(instantiate_db):
-    taxaPlease = TaxaPlease()
+    assert taxa.get_common_parent_taxid(taxid_e_coli, taxid_escherichia) == taxid_escherichia
+    assert taxa.get_number_of_levels_between_taxa(taxid_e_coli, taxid_escherichia) == {
+        "left_levels_to_common_parent": 0,
+        "right_levels_to_common_parent": 1,
+        "total_levels_between_taxa": 1,
+    }
 
-    ## Methanobrevibacter smithii is Archaea
-    taxid_random_archaea = 2173
 
-    assert taxaPlease.isArchaea(taxid_random_archaea)
+def test_levels_between_missing_taxa(taxa):
+    taxid_e_coli = 562
+    taxid_missing = 999999999
+
+    assert taxa.get_number_of_levels_between_taxa(taxid_missing, taxid_e_coli) is None
+    assert taxa.get_number_of_levels_between_taxa(taxid_e_coli, taxid_missing) is None
+
+
+@pytest.mark.parametrize(
+    ("method", "taxid", "expected"),
+    [
+        ## aloe vera is not a virus, but is a eukaryote
+        ("isVirus", 34199, False),
+        ("isEukaryote", 34199, True),
+        ## Shigella is not Archaea
+        ("isArchaea", 623, False),
+        ## Methanobrevibacter smithii is Archaea
+        ("isArchaea", 2173, True),
+    ],
+    ids=["virus_fail", "eukaryote_pass", "archaea_fail", "archaea_pass"],
+)
+def test_is_kingdom(taxa, method, taxid, expected):
+    assert getattr(taxa, method)(taxid) == expected
+
+
+def test_is_bacteria_includes_self(taxa):
+    ## Bacteria itself counts, whether the taxid is an int or a str
+    taxid_bacteria = 2
 
+    assert taxa.isBacteria(taxid_bacteria)
+    assert taxa.isBacteria(str(taxid_bacteria))
 
-def test_current_taxid(instantiate_db):
-    taxaPlease = TaxaPlease()
 
-    taxid_bacteria = 2
+def test_string_taxids_match_ints(taxa):
+    ## E. coli's genus, given as a str, comes back as an int
+    taxid_escherichia = 561
 
-    assert taxaPlease.checkTaxidStatus(taxid_bacteria) == {
-        "isCurrent": True,
-        "isDeleted": False,
-        "isMerged": False,
+    assert taxa.get_genus_taxid(str(taxid_escherichia)) == taxid_escherichia
+    assert taxa.get_number_of_levels_between_taxa("562", 562) == {
+        "left_levels_to_common_parent": 0,
+        "right_levels_to_common_parent": 0,
+        "total_levels_between_taxa": 0,
     }
 
 
-def test_deleted_taxid(instantiate_db):
-    taxaPlease = TaxaPlease()
-
-    deletedTaxid = 3467805
+def test_float_and_bool_taxids(taxa):
+    ## whole number floats are taxids, but fractions and bools match
+    ## nothing - True mustn't be read as the root
+    taxid_e_coli = 562
 
-    assert taxaPlease.checkTaxidStatus(deletedTaxid) == {
+    assert taxa.get_record(float(taxid_e_coli)) == taxa.get_record(taxid_e_coli)
+    assert taxa.get_record(562.9) is None
+    assert taxa.get_parent_taxid(562.9) is None
+    assert taxa.get_record(True) is None
+    assert taxa.get_parent_taxid(True) is None
+    assert not taxa.checkTaxidStatus(True)["isCurrent"]
+
+    ## too big for SQLite to bind, so can't be in the database
+    assert taxa.get_record("99999999999999999999") is None
+    assert taxa.get_parent_record("99999999999999999999") is None
+
+
+@pytest.mark.parametrize(
+    ("taxid", "expected"),
+    [
+        ## Bacteria
+        (2, {"isCurrent": True, "isDeleted": False, "isMerged": False}),
+        (3467805, {"isCurrent": False, "isDeleted": True, "isMerged": False}),
+        ## Photobacterium profundum, old and new taxids
+        (12, {"isCurrent": False, "isDeleted": False, "isMerged": 74109}),
+    ],
+    ids=["current", "deleted", "merged"],
+)
+def test_taxid_status(taxa, taxid, expected):
+    assert taxa.checkTaxidStatus(taxid) == expected
+
+
+def test_status_lookup_edges(taxa):
+    ## checkTaxidStatus searches a sorted array of deleted and merged
+    ## taxids - try it past both ends, on junk, and on a taxid the dump
+    ## lists as both deleted and merged
+    deleted, merged = -1, 101
+    first, both, last = 999999910, 999999920, 999999930
+
+    status = type(taxa)()
+    status._status_taxid = np.array([first, both, both, last], dtype=np.int64)
+    status._status = np.array([deleted, deleted, merged, merged], dtype=np.int32)
+
+    not_found = {"isCurrent": False, "isDeleted": False, "isMerged": False}
+
+    assert status.checkTaxidStatus(last + 10) == not_found
+    assert status.checkTaxidStatus(first - 10) == not_found
+    assert status.checkTaxidStatus("not a taxid") == not_found
+    assert status.checkTaxidStatus(first) == {
         "isCurrent": False,
         "isDeleted": True,
         "isMerged": False,
     }
+    assert status.checkTaxidStatus(last) == {
+        "isCurrent": False,
+        "isDeleted": False,
+        "isMerged": merged,
+    }
+    assert status.checkTaxidStatus(both) == {
+        "isCurrent": False,
+        "isDeleted": True,
+        "isMerged": merged,
+    }
 
 
-def test_merged_taxid(instantiate_db):
-    taxaPlease = TaxaPlease()
+def test_pickle_round_trip(taxa):
+    ## pickling reopens the database rather than copying it,
+    ## but keeps any overridden lookups
+    taxid_e_coli = 562
 
-    photobacteriumProfundumOld = 12
-    photobacteriumProfundumNew = 74109
+    original = type(taxa)()
+    original.phages = {taxid_e_coli: "not really a phage"}
 
-    assert taxaPlease.checkTaxidStatus(photobacteriumProfundumOld) == {
-        "isCurrent": False,
-        "isDeleted": False,
-        "isMerged": photobacteriumProfundumNew,
-    }
+    copy = pickle.loads(pickle.dumps(original))
 
+    assert copy.phages == original.phages
+    assert copy.isPhage(taxid_e_coli)
+    assert copy.get_record(taxid_e_coli) == taxa.get_record(taxid_e_coli)
 
-def test_phages(instantiate_db):
-    taxaPlease = TaxaPlease()
 
+def test_phages(taxa):
     topLevelPhage = 2731619  ## Caudoviricetes
     subLevelPhage = 2560487  ## Bowservirus bowser
 
-    assert taxaPlease.isPhage(topLevelPhage)
-    assert taxaPlease.isPhage(subLevelPhage)
+    assert taxa.isPhage(topLevelPhage)
+    assert taxa.isPhage(subLevelPhage)